@@ -0,0 +1,261 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from config.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from habits.models import Habit
+from habits.ratelimit import MemoryRateLimiter
+from habits.serializers import HABIT_VALUES, HabitSerializer, PublicHabitSerializer, serialize_habit_rows
+from habits.services import create_replacements, get_due_habits, make_replacements
+from habits.tasks import send_messages_batch
+from habits.validators import HabitValidator
+from habits.views import HabitListAPIView
+from users.models import User
+
+
+def measure(func, repeat: int) -> float:
+    """Returns the best time of a call of func in secs out of repeat calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+def benchmark_habit_list(user: User, sizes: list[int], repeat: int) -> list[dict]:
+    """Measures habit list responses of the user for every page size and rendering of as many habits with
+    HabitSerializer and with the fast read path, so that sizes beyond max_page_size are covered too."""
+    view = HabitListAPIView.as_view()
+    factory = APIRequestFactory()
+    renderer = JSONRenderer()
+    habits = Habit.objects.filter(user=user).order_by("pk")
+    results = []
+    for size in sizes:
+
+        def request_page():
+            request = factory.get("/habits", {"page_size": size})
+            force_authenticate(request, user=user)
+            view(request).render()
+
+        def serialize_instances():
+            renderer.render(HabitSerializer(habits[:size], many=True).data)
+
+        def serialize_rows():
+            renderer.render(serialize_habit_rows(habits.values(*HABIT_VALUES)[:size]))
+
+        page_time = measure(request_page, repeat)
+        instances_time, rows_time = measure(serialize_instances, repeat), measure(serialize_rows, repeat)
+        results.append(
+            {
+                "size": size,
+                "view requests/s": round(1 / page_time, 1),
+                "serializer habits/s": round(size / instances_time),
+                "fast path habits/s": round(size / rows_time),
+                "speedup": round(instances_time / rows_time, 2),
+            }
+        )
+    return results
+
+
+def get_renderer_payloads(user: User, size: int) -> dict[str, object]:
+    """Returns data of a habit list of the given size and of a public feed page of the same size."""
+    habits = Habit.objects.filter(user=user).order_by("pk")[:size]
+    return {
+        f"habit list ({size})": {"results": serialize_habit_rows(habits.values(*HABIT_VALUES))},
+        f"public feed ({size})": {"results": PublicHabitSerializer(habits, many=True).data},
+    }
+
+
+def benchmark_renderers(payloads: dict[str, object], repeat: int) -> list[dict]:
+    """Measures encode time and payload size of every payload with DRF's JSONRenderer, FastJSONRenderer and
+    MessagePackRenderer (if msgpack is installed)."""
+    renderers = {"json": JSONRenderer(), "fast json": FastJSONRenderer()}
+    if msgpack is not None:
+        renderers["msgpack"] = MessagePackRenderer()
+    results = []
+    for name, data in payloads.items():
+        baseline = None
+        for renderer_name, renderer in renderers.items():
+            encode_time = measure(lambda: renderer.render(data), repeat)
+            baseline = baseline or encode_time
+            results.append(
+                {
+                    "payload": name,
+                    "renderer": renderer_name,
+                    "encode ms": round(encode_time * 1000, 3),
+                    "bytes": len(renderer.render(data)),
+                    "speedup": round(baseline / encode_time, 2),
+                }
+            )
+    return results
+
+
+def get_habit_payload(related_habit: Habit) -> dict:
+    """Returns a request body of a good habit performed on selected days with a related habit."""
+    return {
+        "place": "Place",
+        "time": "2025-03-30T16:30:00+03:00",
+        "action": "Action",
+        "is_pleasant": False,
+        "frequency": "m h * * d",
+        "related_habit_id": related_habit.pk,
+        "time_needed": 90,
+        "days_of_week": [1, 2],
+        "is_public": False,
+    }
+
+
+def result(name: str, duration: float, items: int = 1) -> dict:
+    """Renders the best time of a benchmark, items is the number of habits or requests handled by a run."""
+    return {"benchmark": name, "best ms": round(duration * 1000, 3), "items/s": round(items / duration, 1)}
+
+
+def benchmark_services(user: User, repeat: int) -> list[dict]:
+    """Measures rendering of frequencies and validation of a habit."""
+    habit = Habit.objects.filter(user=user, is_pleasant=False).first()
+    pleasant_habit = Habit.objects.filter(user=user, is_pleasant=True).first()
+    replacements = create_replacements(habit)
+    attrs = {**get_habit_payload(pleasant_habit), "days_of_week": 0b11}
+    serializer = HabitSerializer(context={"related_habits": {pleasant_habit.pk: pleasant_habit}})
+    validator = HabitValidator()
+    return [
+        result("create_replacements", measure(lambda: create_replacements(habit), repeat)),
+        result("make_replacements", measure(lambda: make_replacements("m x,z,y * * d", replacements), repeat)),
+        result("HabitValidator", measure(lambda: validator(dict(attrs), serializer), repeat)),
+    ]
+
+
+def benchmark_serializers(user: User, repeat: int) -> list[dict]:
+    """Measures rendering of all habits of the user with HabitSerializer and with the fast read path."""
+    habits = Habit.objects.filter(user=user).order_by("pk")
+    count = habits.count()
+    renderer = JSONRenderer()
+    instances = list(habits)
+    rows = list(habits.values(*HABIT_VALUES))
+    return [
+        result(
+            "HabitSerializer list",
+            measure(lambda: renderer.render(HabitSerializer(instances, many=True).data), repeat),
+            count,
+        ),
+        result("serialize_habit_rows", measure(lambda: renderer.render(serialize_habit_rows(rows)), repeat), count),
+    ]
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+def benchmark_views(user: User, repeat: int, bulk_size: int) -> list[dict]:
+    """Measures every habits endpoint through the test client as the user. Deleted habits are created
+    beforehand, so that every run deletes one."""
+    client = APIClient()
+    client.force_authenticate(user)
+    habit = Habit.objects.filter(user=user, is_pleasant=False).first()
+    pleasant_habit = Habit.objects.filter(user=user, is_pleasant=True).first()
+    payload = get_habit_payload(pleasant_habit)
+    # The updated habit has a reward, which can't be selected together with a related habit.
+    update_payload = {**payload, "related_habit_id": None, "reward": "Reward"}
+    deleted = iter(
+        Habit.objects.bulk_create(
+            Habit(user=user, place="Place", action="Action", is_pleasant=True, time_needed=30, is_public=False)
+            for _ in range(repeat)
+        )
+    )
+    # Requests and the number of habits each one handles.
+    requests = {
+        "habit list": (lambda: client.get(reverse("habits:habit-list")), 1),
+        "public habit list": (lambda: client.get(reverse("habits:public-habit-list")), 1),
+        "habit detail": (lambda: client.get(reverse("habits:habit-detail", args=(habit.pk,))), 1),
+        "habit create": (lambda: client.post(reverse("habits:habit-create"), payload, format="json"), 1),
+        "habit update": (
+            lambda: client.put(reverse("habits:habit-update", args=(habit.pk,)), update_payload, format="json"),
+            1,
+        ),
+        f"habit bulk ({bulk_size})": (
+            lambda: client.post(reverse("habits:habit-bulk"), [payload] * bulk_size, format="json"),
+            bulk_size,
+        ),
+        "habit delete": (lambda: client.delete(reverse("habits:habit-delete", args=(next(deleted).pk,))), 1),
+    }
+    results = []
+    for name, (request, items) in requests.items():
+
+        def run():
+            response = request()
+            if response.status_code >= 400:
+                raise ValueError(f"{name} responded with {response.status_code}: {response.content[:200]!r}")
+
+        results.append(result(f"view: {name}", measure(run, repeat), items))
+    return results
+
+
+class TelegramStubHandler(BaseHTTPRequestHandler):
+    """Answers every request like a successful sendMessage call of the Bot API."""
+
+    protocol_version = "HTTP/1.1"
+    body = json.dumps({"ok": True, "result": {}}).encode()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def telegram_stub():
+    """Runs a local stub of the Telegram Bot API and points reminders to it (see TELEGRAM_API_URL). Rate limits
+    are lifted, so that the delivery code is measured rather than the limits."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    rate_limiter = MemoryRateLimiter(global_rate=1e9, chat_rate=1e9)
+    try:
+        with (
+            mock.patch("habits.telegram.TELEGRAM_API_URL", f"http://127.0.0.1:{server.server_port}"),
+            mock.patch("habits.delivery.get_rate_limiter", return_value=rate_limiter),
+        ):
+            yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmark_reminders(repeat: int, batch_size: int) -> list[dict]:
+    """Measures selection of all due habits and delivery of a batch of reminders to the Telegram stub. Selected
+    habits are rolled back after every run, so that every run finds them due."""
+    moment = timezone.now()
+
+    def dispatch():
+        with transaction.atomic():
+            pks = get_due_habits(moment)
+            transaction.set_rollback(True)
+        return pks
+
+    pks = dispatch()
+    batch = pks[:batch_size]
+    with telegram_stub():
+        outcomes = send_messages_batch(batch)
+        if any(outcome["status"] != "sent" for outcome in outcomes):
+            raise ValueError(f"Reminders were not sent to the Telegram stub: {outcomes[:5]}")
+        delivery_time = measure(lambda: send_messages_batch(batch), repeat)
+    return [
+        result("get_due_habits", measure(dispatch, repeat), len(pks)),
+        result(f"send_messages_batch ({len(batch)})", delivery_time, len(batch)),
+    ]
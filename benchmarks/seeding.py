@@ -0,0 +1,53 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from habits.models import Habit
+from users.models import User
+
+
+def seed_users(
+    users_count: int, habits_count: int, pleasant_share: float = 0.0, public_share: float = 0.1, due_share: float = 1.0
+) -> list[User]:
+    """Creates users with a telegram chat, a public pleasant habit and habits_count habits each. The given shares of
+    the habits are pleasant, public and due now, other good habits are due within a day. Habits are picked with a
+    fixed seed, so that runs are comparable. Should be run in a transaction that is rolled back."""
+    rng = random.Random(0)
+    prefix = uuid.uuid4().hex
+    users = User.objects.bulk_create(
+        User(email=f"{prefix}-{i}@example.com", tg_chat_id=str(i)) for i in range(users_count)
+    )
+    now = timezone.now()
+    habits = []
+    for user in users:
+        habits.append(
+            Habit(user=user, place="Place", action="Pleasant action", is_pleasant=True, time_needed=30, is_public=True)
+        )
+        for i in range(habits_count):
+            is_pleasant = rng.random() < pleasant_share
+            is_due = rng.random() < due_share
+            habits.append(
+                Habit(
+                    user=user,
+                    place=f"Place {i}",
+                    action=f"Action {i}",
+                    is_pleasant=is_pleasant,
+                    time=None if is_pleasant else now,
+                    frequency=None if is_pleasant else f"{now.minute} {now.hour} * * mon,wed",
+                    reward=None if is_pleasant else f"Reward {i}",
+                    days_of_week=0 if is_pleasant else 0b101,
+                    time_needed=60,
+                    is_public=rng.random() < public_share,
+                    next_fire_at=(
+                        None if is_pleasant else now + timedelta(minutes=-1 if is_due else rng.randint(1, 1440))
+                    ),
+                )
+            )
+    Habit.objects.bulk_create(habits)
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Habit._meta.db_table}")
+    return users
@@ -0,0 +1,96 @@
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection
+
+from config.settings import REQUEST_TIMING_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """Number of queries, SQL time and named phase timings (secs) of a request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.phases = {}
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their time."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+    def add(self, name: str, duration: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+
+current_timings = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Adds the time spent in the block to the named phase of the current request. Does nothing if the request
+    is not sampled or outside of requests. Can be used as a decorator too."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def format_server_timing(timings: RequestTimings, total: float) -> str:
+    """Renders timings as a Server-Timing header value, durations are in milliseconds."""
+    metrics = [f'db;dur={timings.sql_time * 1000:.2f};desc="{timings.queries} queries"']
+    metrics += [f"{name};dur={duration * 1000:.2f}" for name, duration in timings.phases.items()]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+class RequestTimingMiddleware:
+    """Records query count, SQL time and phase timings of a sample of requests (see REQUEST_TIMING_SAMPLE_RATE),
+    returns them in the Server-Timing header and logs them as JSON. Other requests are passed through as is."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.execute):
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - start
+
+        response["Server-Timing"] = format_server_timing(timings, total)
+        resolver_match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": resolver_match.view_name if resolver_match else None,
+            "status": response.status_code,
+            "queries": timings.queries,
+            "sql_ms": round(timings.sql_time * 1000, 2),
+            "phases_ms": {name: round(duration * 1000, 2) for name, duration in timings.phases.items()},
+            "total_ms": round(total * 1000, 2),
+        }
+        logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from config.renderers import FastJSONRenderer, MessagePackRenderer, msgpack, orjson
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser that decodes UTF-8 requests with orjson when it's installed."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackParser(BaseParser):
+    """Parses MessagePack requests sent with "Content-Type: application/msgpack". Requires msgpack."""
+
+    media_type = "application/msgpack"
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if msgpack is None:
+            raise ImproperlyConfigured(
+                "msgpack is required to parse MessagePack, install it with `pip install msgpack`."
+            )
+        try:
+            # Unlike JSON, MessagePack maps may have non-string keys, the renderer keeps them too.
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except ValueError as exc:
+            raise ParseError(f"MessagePack parse error - {exc}")
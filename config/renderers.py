@@ -0,0 +1,58 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from config.instrumentation import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# UTF-8 encoded line and paragraph separators, escaped by JSONRenderer as they're invalid in JavaScript strings.
+LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it's installed, the output is the same. Values orjson doesn't
+    support natively (dates, decimals, lazy strings etc) are encoded by DRF's encoder. Indented and ASCII-only
+    output is left to JSONRenderer."""
+
+    @phase("render")
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or data is None or indent or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        content = orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in content:
+                content = content.replace(separator, escaped)
+        return content
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Renders data as MessagePack for clients sending "Accept: application/msgpack". Requires msgpack."""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    @phase("render")
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if msgpack is None:
+            raise ImproperlyConfigured(
+                "msgpack is required to render MessagePack, install it with `pip install msgpack`."
+            )
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=JSONEncoder().default)
@@ -1,7 +1,9 @@
 import os
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,13 +32,28 @@ INSTALLED_APPS = [
     "django_celery_beat",
 ]
 
+# MessagePack is offered to clients sending "Accept: application/msgpack" if msgpack is installed.
+MSGPACK_ENABLED = find_spec("msgpack") is not None
+
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.CachedJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": (
+        "config.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    )
+    + (("config.renderers.MessagePackRenderer",) if MSGPACK_ENABLED else ()),
+    "DEFAULT_PARSER_CLASSES": (
+        "config.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    )
+    + (("config.parsers.MessagePackParser",) if MSGPACK_ENABLED else ()),
 }
 
 MIDDLEWARE = [
+    "config.instrumentation.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,6 +63,21 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Share of requests (0-1) whose query count, SQL time and phase timings are returned in the Server-Timing header
+# and logged as JSON.
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv("REQUEST_TIMING_SAMPLE_RATE", 0.01))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "config.instrumentation": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -77,6 +109,21 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": (
+            "django.core.cache.backends.redis.RedisCache"
+            if os.getenv("CACHE_LOCATION")
+            else "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Whether the cache is shared by all processes (CACHE_LOCATION is set). Caches kept in memory by every process are
+# only used with a shared cache, as they are invalidated through it.
+SHARED_CACHE = CACHES["default"]["BACKEND"] != "django.core.cache.backends.locmem.LocMemCache"
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,12 +154,28 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "users.User"
 
+# "memory" or "redis" buffers logins and writes last_login of all users in bulk every LAST_LOGIN_FLUSH_INTERVAL secs,
+# last_login is updated on every login if empty. "redis" buffers are written by a Celery task. "memory" buffers are
+# per process and written by a thread of every process, logins buffered by a killed process are lost.
+LAST_LOGIN_BUFFER = os.getenv("LAST_LOGIN_BUFFER", "")
+
+LAST_LOGIN_FLUSH_INTERVAL = int(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", 60))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
-    "UPDATE_LAST_LOGIN": True,
+    "UPDATE_LAST_LOGIN": not LAST_LOGIN_BUFFER,
 }
 
+# Users are cached by every process for JWT authentication only with a shared cache (CACHE_LOCATION), as users
+# changed by one process are invalidated in the others through it.
+JWT_USER_CACHE_ENABLED = SHARED_CACHE
+
+# Max number of users kept in memory by every process for JWT authentication and their time to live (secs).
+JWT_USER_CACHE_SIZE = int(os.getenv("JWT_USER_CACHE_SIZE", 1024))
+
+JWT_USER_CACHE_TIMEOUT = int(os.getenv("JWT_USER_CACHE_TIMEOUT", 60))
+
 CORS_ALLOWED_ORIGINS = ("http://localhost:8000",)
 
 CSRF_TRUSTED_ORIGINS = ("http://localhost:8000",)
@@ -133,16 +196,87 @@ CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 
+LAST_LOGIN_REDIS_URL = os.getenv("LAST_LOGIN_REDIS_URL", CELERY_BROKER_URL)
+
 CELERY_TIMEZONE = TIME_ZONE
 
 CELERY_TASK_TRACK_STARTED = True
 
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
-CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# "habits.schedulers:IncrementalDatabaseScheduler" applies changed tasks only instead of reloading the schedule.
+CELERY_BEAT_SCHEDULER = os.getenv("CELERY_BEAT_SCHEDULER", "django_celery_beat.schedulers:DatabaseScheduler")
+
+CELERY_BEAT_SCHEDULE = {
+    "drain-schedule-outbox": {
+        "task": "habits.tasks.drain_schedule_outbox",
+        "schedule": crontab(),
+    },
+}
+
+# Memory buffers are written by a thread of every process, only Redis buffers need the task.
+if LAST_LOGIN_BUFFER == "redis":
+    CELERY_BEAT_SCHEDULE["flush-last-logins"] = {
+        "task": "users.tasks.flush_buffered_logins",
+        "schedule": LAST_LOGIN_FLUSH_INTERVAL,
+    }
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 10))
+
+TELEGRAM_MAX_IN_FLIGHT = int(os.getenv("TELEGRAM_MAX_IN_FLIGHT", 20))
+
+TELEGRAM_TIMEOUT = int(os.getenv("TELEGRAM_TIMEOUT", 10))
+
+# "redis" shares the limits between all worker processes, "memory" keeps them per process (tests, local runs).
+TELEGRAM_RATE_LIMIT_BACKEND = os.getenv("TELEGRAM_RATE_LIMIT_BACKEND", "memory")
+
+TELEGRAM_RATE_LIMIT_REDIS_URL = os.getenv("TELEGRAM_RATE_LIMIT_REDIS_URL", CELERY_BROKER_URL)
+
+# Messages per second for the whole bot and for a single chat.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+
+# "periodic_task" creates a beat entry per good habit, "dispatcher" sends all reminders from a single minute tick.
+# Run disable_reminder_tasks after switching to "dispatcher" and reconcile_reminders after switching back.
+HABIT_REMINDER_MODE = os.getenv("HABIT_REMINDER_MODE", "periodic_task")
+
+if HABIT_REMINDER_MODE == "dispatcher":
+    CELERY_BEAT_SCHEDULE["dispatch-reminders"] = {
+        "task": "habits.tasks.dispatch_reminders",
+        "schedule": crontab(),
+    }
+
+HABIT_REMINDER_BATCH_SIZE = int(os.getenv("HABIT_REMINDER_BATCH_SIZE", 100))
+
+# Spreads reminders due in the same minute over the jitter window (secs) in dispatcher mode, never sending them early.
+HABIT_REMINDER_SMOOTHING = os.getenv("HABIT_REMINDER_SMOOTHING", False) == "True"
+
+HABIT_REMINDER_JITTER = int(os.getenv("HABIT_REMINDER_JITTER", 120))
+
+# Max number of habit changes synced to reminder tasks in one transaction.
+SCHEDULE_OUTBOX_BATCH_SIZE = int(os.getenv("SCHEDULE_OUTBOX_BATCH_SIZE", 500))
+
+# Crontab schedule ids are cached by every process only with a shared cache (CACHE_LOCATION), as schedules deleted
+# by one process are invalidated in the others through it. Max number of ids kept in memory by every process.
+SCHEDULE_CACHE_ENABLED = SHARED_CACHE
+SCHEDULE_CACHE_SIZE = int(os.getenv("SCHEDULE_CACHE_SIZE", 1024))
+
+# Max number of habits saved by a single bulk request.
+HABIT_BULK_MAX_SIZE = int(os.getenv("HABIT_BULK_MAX_SIZE", 500))
+
+# "page" pages habit lists by page number, "cursor" by primary key. Can be overridden with ?pagination=<mode>.
+HABIT_PAGINATION = os.getenv("HABIT_PAGINATION", "page")
+
+# Rendered public habit pages are cached only with a shared cache (CACHE_LOCATION), as changed public habits are
+# invalidated in all processes through it. Time to live of a cached page (secs).
+PUBLIC_HABITS_CACHE_ENABLED = SHARED_CACHE
+PUBLIC_HABITS_CACHE_TIMEOUT = int(os.getenv("PUBLIC_HABITS_CACHE_TIMEOUT", 300))
+
 HABIT_FREQUENCY = (
     ("m x-y * * *", "every hour"),
     ("m x-y/2 * * *", "every 2 hours"),
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import requests
+
+from config.settings import TELEGRAM_MAX_IN_FLIGHT
+from habits.models import Habit
+from habits.ratelimit import get_rate_limiter
+from habits.services import create_reminder_text
+from habits.telegram import send_telegram_message
+
+MAX_ATTEMPTS = 3
+
+
+class Reminder(NamedTuple):
+    """Rendered reminder ready to be sent."""
+
+    habit: int
+    chat_id: str
+    text: str
+
+
+def load_reminders(pks: list[int]) -> tuple[list[Reminder], list[dict]]:
+    """Renders reminders of habits with a single query. Returns reminders and outcomes of the habits which reminders
+    can't be sent."""
+    habits = {habit.pk: habit for habit in Habit.objects.select_related("user", "related_habit").filter(pk__in=pks)}
+    reminders, skipped = [], []
+    for pk in pks:
+        habit = habits.get(pk)
+        if habit is None:
+            skipped.append({"habit": pk, "status": "not found"})
+        elif not habit.user or not habit.user.tg_chat_id:
+            skipped.append({"habit": pk, "status": "no chat id"})
+        else:
+            reminders.append(Reminder(pk, habit.user.tg_chat_id, create_reminder_text(habit)))
+    return reminders, skipped
+
+
+def get_retry_after(response: requests.Response) -> float:
+    """Returns the number of seconds Telegram asked to wait in a 429 response. Responses of proxies may have no JSON
+    body, the Retry-After header or 1 sec is used then."""
+    try:
+        retry_after = response.json().get("parameters", {}).get("retry_after")
+    except (ValueError, AttributeError):
+        retry_after = None
+    if retry_after is None:
+        retry_after = response.headers.get("Retry-After", 1)
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return 1
+
+
+def send_reminder(reminder: Reminder) -> dict:
+    """Sends a reminder and reports the outcome. A 429 response blocks the rate limiter for the time Telegram asked
+    to wait."""
+    try:
+        response = send_telegram_message(reminder.chat_id, reminder.text)
+    except requests.RequestException as e:
+        # Messages of requests exceptions include the URL, which contains the bot token.
+        return {"habit": reminder.habit, "status": "error", "detail": type(e).__name__}
+    if response.status_code == 429:
+        retry_after = get_retry_after(response)
+        get_rate_limiter().block(retry_after)
+        return {"habit": reminder.habit, "status": "throttled", "detail": f"retry after {retry_after:g} s"}
+    if not response.ok:
+        return {"habit": reminder.habit, "status": "error", "detail": f"{response.status_code} {response.text}"}
+    return {"habit": reminder.habit, "status": "sent"}
+
+
+def deliver_reminder(reminder: Reminder) -> dict:
+    """Sends a reminder within the rate limits, retrying it when Telegram responds with 429."""
+    for _ in range(MAX_ATTEMPTS):
+        time.sleep(get_rate_limiter().reserve(reminder.chat_id))
+        outcome = send_reminder(reminder)
+        if outcome["status"] != "throttled":
+            break
+    return outcome
+
+
+async def deliver_chat(reminders: list[Reminder], semaphore: asyncio.Semaphore) -> list[dict]:
+    """Sends reminders of one chat one after another within the rate limits, so that their order is preserved."""
+    rate_limiter = get_rate_limiter()
+    outcomes = []
+    for reminder in reminders:
+        for _ in range(MAX_ATTEMPTS):
+            await asyncio.sleep(await asyncio.to_thread(rate_limiter.reserve, reminder.chat_id))
+            async with semaphore:
+                outcome = await asyncio.to_thread(send_reminder, reminder)
+            if outcome["status"] != "throttled":
+                break
+        outcomes.append(outcome)
+    return outcomes
+
+
+async def deliver_reminders_async(reminders: list[Reminder], max_in_flight: int) -> list[dict]:
+    """Sends reminders of different chats concurrently with not more than max_in_flight requests at a time."""
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max_in_flight))
+    chats = {}
+    for reminder in reminders:
+        chats.setdefault(reminder.chat_id, []).append(reminder)
+    semaphore = asyncio.Semaphore(max_in_flight)
+    results = await asyncio.gather(*(deliver_chat(chat, semaphore) for chat in chats.values()))
+    return [outcome for outcomes in results for outcome in outcomes]
+
+
+def deliver_reminders(reminders: list[Reminder], max_in_flight: int = TELEGRAM_MAX_IN_FLIGHT) -> list[dict]:
+    """Sends reminders concurrently, see deliver_reminders_async."""
+    if not reminders:
+        return []
+    return asyncio.run(deliver_reminders_async(reminders, max_in_flight))
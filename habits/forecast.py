@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
+from django.utils import timezone
+
+from habits.models import Habit
+from habits.schedules import compile_crontab
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MINUTES_PER_DAY = 24 * 60
+
+CHUNK_SIZE = 2048
+
+
+def load_schedules() -> tuple[list[str], list[int]]:
+    """Returns distinct crontabs of good habits that are reminded about and the number of habits for each one.
+    The crontab is rendered from time, end time, frequency and days of week, so grouping by it in the database
+    leaves one row per distinct schedule."""
+    rows = (
+        Habit.objects.filter(is_pleasant=False, frequency__isnull=False, user__tg_chat_id__isnull=False)
+        .exclude(user__tg_chat_id="")
+        .values("frequency")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    crontabs, counts = [], []
+    for row in rows:
+        try:
+            compile_crontab(row["frequency"])
+        except ValueError:
+            continue
+        crontabs.append(row["frequency"])
+        counts.append(row["count"])
+    return crontabs, counts
+
+
+def expand_schedules(crontabs: list[str], counts: list[int], start: datetime, minutes: int) -> "np.ndarray":
+    """Counts reminders sent in every minute of the horizon starting at start in one vectorised pass: schedules are
+    turned into masks of minutes of day and of days, multiplied by the number of habits and summed up."""
+    if np is None:
+        raise ImproperlyConfigured("NumPy is required to forecast reminders, install it with `pip install numpy`.")
+    start = timezone.localtime(start).replace(second=0, microsecond=0)
+    offset = start.hour * 60 + start.minute
+    days = [start.date() + timedelta(days=i) for i in range((offset + minutes - 1) // MINUTES_PER_DAY + 1)]
+    day_of_month = np.array([day.day for day in days])
+    month = np.array([day.month for day in days])
+    day_of_week = np.array([day.isoweekday() % 7 for day in days])
+
+    histogram = np.zeros((len(days), MINUTES_PER_DAY), dtype=np.int64)
+    for chunk_start in range(0, len(crontabs), CHUNK_SIZE):
+        chunk_end = chunk_start + CHUNK_SIZE
+        schedules = [compile_crontab(crontab) for crontab in crontabs[chunk_start:chunk_end]]
+        weights = np.array(counts[chunk_start:chunk_end], dtype=np.int64)
+        minute_masks = np.zeros((len(schedules), 60), dtype=bool)
+        hour_masks = np.zeros((len(schedules), 24), dtype=bool)
+        day_of_month_masks = np.zeros((len(schedules), 32), dtype=bool)
+        month_masks = np.zeros((len(schedules), 13), dtype=bool)
+        day_of_week_masks = np.zeros((len(schedules), 7), dtype=bool)
+        for i, schedule in enumerate(schedules):
+            minute_masks[i, list(schedule.minutes)] = True
+            hour_masks[i, list(schedule.hours)] = True
+            day_of_month_masks[i, list(schedule.days_of_month)] = True
+            month_masks[i, list(schedule.months)] = True
+            day_of_week_masks[i, list(schedule.days_of_week)] = True
+
+        day_matches = day_of_month_masks[:, day_of_month] & month_masks[:, month] & day_of_week_masks[:, day_of_week]
+        minutes_of_day = (hour_masks[:, :, None] & minute_masks[:, None, :]).reshape(len(schedules), MINUTES_PER_DAY)
+        histogram += (day_matches * weights[:, None]).T @ minutes_of_day.astype(np.int64)
+
+    end = offset + minutes
+    return histogram.reshape(-1)[offset:end]
+
+
+def forecast_reminders(start: datetime, minutes: int) -> "np.ndarray":
+    """Counts reminders of all good habits that will be sent in every minute of the horizon starting at start."""
+    crontabs, counts = load_schedules()
+    return expand_schedules(crontabs, counts, start, minutes)
+
+
+def summarize_forecast(volumes: "np.ndarray", start: datetime, top: int = 10) -> dict:
+    """Renders the total number of reminders and the busiest minutes of a forecast."""
+    start = timezone.localtime(start).replace(second=0, microsecond=0)
+    busiest = np.argsort(volumes, kind="stable")[::-1][:top]
+    return {
+        "start": start.isoformat(),
+        "minutes": len(volumes),
+        "total": int(volumes.sum()),
+        "busiest": [
+            {"minute": (start + timedelta(minutes=int(i))).isoformat(), "reminders": int(volumes[i])}
+            for i in busiest
+            if volumes[i]
+        ],
+    }
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from benchmarks.harness import benchmark_habit_list
+from benchmarks.seeding import seed_users
+from habits.paginators import HabitPagination
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures throughput of the habit list view and of serialization of habits with HabitSerializer and with "
+        "the fast read path. The seeded data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=lambda sizes: [int(size) for size in sizes.split(",")],
+            default=[5, HabitPagination.max_page_size, 100, 1000],
+            help="Comma-separated page sizes. The view caps them at max_page_size, serialization doesn't.",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Number of runs, the best one is reported.")
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            user = seed_users(1, max(kwargs["sizes"]))[0]
+            results = benchmark_habit_list(user, kwargs["sizes"], kwargs["repeat"])
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(results, indent=4))
+        self.stdout.write(self.style.SUCCESS("Seeded data rolled back."))
@@ -0,0 +1,33 @@
+import json
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from benchmarks.harness import benchmark_renderers, get_renderer_payloads
+from benchmarks.seeding import seed_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares encode time and payload size of habit lists and public feed pages rendered by DRF's JSON "
+        "renderer, the fast JSON renderer and MessagePack. The seeded data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=lambda sizes: [int(size) for size in sizes.split(",")],
+            default=[10, 100, 1000],
+            help="Comma-separated numbers of habits in a payload.",
+        )
+        parser.add_argument("--repeat", type=int, default=50, help="Number of runs, the best one is reported.")
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            user = seed_users(1, max(kwargs["sizes"]))[0]
+            payloads = {}
+            for size in kwargs["sizes"]:
+                payloads.update(get_renderer_payloads(user, size))
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(benchmark_renderers(payloads, kwargs["repeat"]), indent=4))
+        self.stdout.write(self.style.SUCCESS("Seeded data rolled back."))
@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django_celery_beat.models import PeriodicTask, PeriodicTasks
+
+from habits.models import Habit
+from habits.services import delete_periodic_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes reminder tasks of habits that no longer exist. Tasks are scanned in chunks by primary key, every "
+        "chunk is checked and deleted in its own short transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Number of tasks checked at once.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count orphaned tasks.")
+
+    def get_habit_pk(self, args: str) -> int | None:
+        """Returns the habit primary key from args of a task, None if the args are empty or malformed."""
+        try:
+            habit_pk = json.loads(args)[0]
+        except (TypeError, ValueError, IndexError, KeyError):
+            return None
+        return habit_pk if isinstance(habit_pk, int) and not isinstance(habit_pk, bool) else None
+
+    def delete_orphans(self, tasks: list[tuple[int, str]], dry_run: bool) -> tuple[int, list[int]]:
+        """Deletes tasks which habits don't exist. Returns the number of orphaned tasks and pks of tasks with
+        malformed args, which are skipped."""
+        habit_pks = {pk: self.get_habit_pk(args) for pk, args in tasks}
+        malformed = [pk for pk, habit_pk in habit_pks.items() if habit_pk is None]
+        habit_pks = {pk: habit_pk for pk, habit_pk in habit_pks.items() if habit_pk is not None}
+        existing = set(Habit.objects.filter(pk__in=set(habit_pks.values())).values_list("pk", flat=True))
+        orphans = [pk for pk, habit_pk in habit_pks.items() if habit_pk not in existing]
+        if orphans and not dry_run:
+            with transaction.atomic():
+                delete_periodic_tasks(PeriodicTask.objects.filter(pk__in=orphans))
+        return len(orphans), malformed
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        tasks = PeriodicTask.objects.filter(task="habits.tasks.send_message").order_by("pk")
+        last_pk, checked, orphans, malformed = 0, 0, 0, []
+        while chunk := list(tasks.filter(pk__gt=last_pk).values_list("pk", "args")[: kwargs["chunk_size"]]):
+            last_pk = chunk[-1][0]
+            checked += len(chunk)
+            chunk_orphans, chunk_malformed = self.delete_orphans(chunk, kwargs["dry_run"])
+            orphans += chunk_orphans
+            malformed += chunk_malformed
+        if orphans and not kwargs["dry_run"]:
+            PeriodicTasks.update_changed()
+        elapsed = time.perf_counter() - started
+
+        action = "found" if kwargs["dry_run"] else "deleted"
+        self.stdout.write(f"checked: {checked}")
+        self.stdout.write(f"malformed: {len(malformed)}")
+        if malformed:
+            self.stdout.write(self.style.WARNING(f"Tasks with malformed args skipped: {malformed}"))
+        self.stdout.write(self.style.SUCCESS(f"{orphans} orphaned reminder tasks {action} in {elapsed:.2f} s."))
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask, PeriodicTasks
+
+from config.settings import HABIT_REMINDER_MODE
+
+
+class Command(BaseCommand):
+    help = (
+        "Disables reminder tasks of all habits after switching to the dispatcher reminder mode, so that reminders "
+        "aren't sent twice. Run reconcile_reminders to enable them again after switching back to periodic_task."
+    )
+
+    def handle(self, *args, **kwargs):
+        if HABIT_REMINDER_MODE != "dispatcher":
+            raise CommandError("Reminder tasks are only disabled in the dispatcher reminder mode.")
+        with transaction.atomic():
+            tasks = PeriodicTask.objects.filter(task="habits.tasks.send_message", enabled=True)
+            disabled = tasks.update(enabled=False, date_changed=timezone.now())
+            if disabled:
+                PeriodicTasks.update_changed()
+        self.stdout.write(self.style.SUCCESS(f"{disabled} reminder tasks disabled."))
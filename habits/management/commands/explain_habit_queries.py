@@ -0,0 +1,49 @@
+import random
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from benchmarks.seeding import seed_users
+from habits.models import Habit
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints EXPLAIN ANALYZE of the habit list, public feed and reminder scheduling queries against seeded data. "
+        "The seeded data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Number of users to seed.")
+        parser.add_argument("--habits", type=int, default=100, help="Number of habits to seed per user.")
+
+    def get_queries(self, user):
+        """Returns the querysets run by habits views and services."""
+        habits = Habit.objects.filter(user=user).order_by("pk")
+        count = habits.count()
+        middle = habits.values_list("pk", flat=True)[count // 2] if count else 0
+        public_habits = Habit.objects.filter(is_public=True).order_by("pk")
+        return {
+            "habit list, first page": habits[:5],
+            "habit list, deep page": habits[50:55],
+            "habit list, cursor page": habits.filter(pk__gt=middle)[:6],
+            "public habits, first page": public_habits[:5],
+            "public habits, deep page": public_habits[1000:1005],
+            "due habits": Habit.objects.select_related("user")
+            .filter(is_pleasant=False, next_fire_at__lte=timezone.now())
+            .only("pk", "frequency", "next_fire_at", "user__tg_chat_id"),
+        }
+
+    def handle(self, *args, **kwargs):
+        if kwargs["users"] < 1:
+            raise CommandError("At least one user must be seeded.")
+        options = {"analyze": True, "buffers": True} if connection.vendor == "postgresql" else {}
+        with transaction.atomic():
+            users = seed_users(kwargs["users"], kwargs["habits"], pleasant_share=0.3, due_share=0.01)
+            for name, queryset in self.get_queries(random.choice(users)).items():
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(queryset.explain(**options))
+                self.stdout.write("")
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Seeded data rolled back."))
@@ -0,0 +1,28 @@
+import json
+import time
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from habits.forecast import forecast_reminders, summarize_forecast
+
+
+class Command(BaseCommand):
+    help = "Forecasts how many reminders will be sent in every minute of the next days. Requires NumPy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Forecast horizon in days.")
+        parser.add_argument("--top", type=int, default=10, help="Number of the busiest minutes to show.")
+        parser.add_argument("--output", help="File to save reminders per minute to, one number per line.")
+
+    def handle(self, *args, **kwargs):
+        start = timezone.now()
+        started = time.perf_counter()
+        volumes = forecast_reminders(start, kwargs["days"] * 24 * 60)
+        elapsed = time.perf_counter() - started
+
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as file:
+                file.writelines(f"{volume}\n" for volume in volumes)
+        self.stdout.write(json.dumps(summarize_forecast(volumes, start, kwargs["top"]), indent=4))
+        self.stdout.write(self.style.SUCCESS(f"Forecast finished in {elapsed:.2f} s."))
@@ -0,0 +1,63 @@
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from config.settings import HABIT_REMINDER_MODE
+from habits.models import Habit
+from habits.services import reconcile_habits
+
+
+def reconcile_chunk(start: int, end: int, sync_tasks: bool) -> Counter:
+    """Reconciles good habits with pks from start (inclusive) to end (exclusive)."""
+    habits = Habit.objects.select_related("user").filter(is_pleasant=False, pk__gte=start, pk__lt=end)
+    return reconcile_habits(list(habits), sync_tasks)
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks rendered frequencies, next reminder times and reminder tasks of all good habits and repairs them in "
+        "bulk. Habits are processed in chunks of primary keys by a pool of processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Number of primary keys in a chunk.")
+        parser.add_argument("--workers", type=int, default=1, help="Number of processes, 1 runs chunks inline.")
+        parser.add_argument(
+            "--no-tasks",
+            action="store_true",
+            help="Don't sync reminder tasks. Tasks are only synced in the periodic_task reminder mode anyway.",
+        )
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        sync_tasks = HABIT_REMINDER_MODE == "periodic_task" and not kwargs["no_tasks"]
+        bounds = Habit.objects.filter(is_pleasant=False).aggregate(first=Min("pk"), last=Max("pk"))
+        chunk_size = kwargs["chunk_size"]
+        starts = range(bounds["first"] or 0, (bounds["last"] or -1) + 1, chunk_size)
+        chunks = [(start, start + chunk_size, sync_tasks) for start in starts]
+
+        counts = Counter()
+        if kwargs["workers"] > 1:
+            # Forked processes must not share the connection of the parent.
+            connections.close_all()
+            with ProcessPoolExecutor(kwargs["workers"], initializer=django.setup) as executor:
+                for future in [executor.submit(reconcile_chunk, *chunk) for chunk in chunks]:
+                    counts.update(future.result())
+        else:
+            for chunk in chunks:
+                counts.update(reconcile_chunk(*chunk))
+        elapsed = time.perf_counter() - started
+
+        for name in ("checked", "invalid", "frequencies repaired", "habits repaired", "tasks repaired"):
+            self.stdout.write(f"{name}: {counts[name]}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{counts['checked']} habits reconciled in {len(chunks)} chunks in {elapsed:.2f} s "
+                f"({counts['checked'] / elapsed if elapsed else 0:.0f} habits/s)."
+            )
+        )
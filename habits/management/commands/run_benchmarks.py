@@ -0,0 +1,55 @@
+import json
+import platform
+
+import django
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+
+from benchmarks.harness import benchmark_reminders, benchmark_serializers, benchmark_services, benchmark_views
+from benchmarks.seeding import seed_users
+from config.settings import HABIT_REMINDER_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Times hot paths of habits: frequency rendering, validation, list serialization, every endpoint and "
+        "reminder delivery to a local Telegram stub. Prints the results as JSON to compare them between commits. "
+        "The seeded data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Number of users to seed.")
+        parser.add_argument("--habits", type=int, default=20, help="Number of good habits to seed per user.")
+        parser.add_argument("--repeat", type=int, default=20, help="Number of runs, the best one is reported.")
+        parser.add_argument("--bulk-size", type=int, default=50, help="Number of habits in a bulk request.")
+        parser.add_argument(
+            "--batch-size", type=int, default=HABIT_REMINDER_BATCH_SIZE, help="Number of reminders in a batch."
+        )
+        parser.add_argument("--output", help="File to write the results to instead of stdout.")
+
+    def handle(self, *args, **kwargs):
+        report = {
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+            },
+            "parameters": {name: kwargs[name] for name in ("users", "habits", "repeat", "bulk_size", "batch_size")},
+        }
+        with transaction.atomic():
+            user = seed_users(kwargs["users"], kwargs["habits"])[0]
+            report["results"] = (
+                benchmark_services(user, kwargs["repeat"])
+                + benchmark_serializers(user, kwargs["repeat"])
+                + benchmark_views(user, kwargs["repeat"], kwargs["bulk_size"])
+                + benchmark_reminders(kwargs["repeat"], kwargs["batch_size"])
+            )
+            transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=4)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        self.stdout.write(self.style.SUCCESS("Seeded data rolled back."))
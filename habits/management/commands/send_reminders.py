@@ -0,0 +1,31 @@
+import time
+from collections import Counter
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from config.settings import TELEGRAM_MAX_IN_FLIGHT
+from habits.delivery import deliver_reminders, load_reminders
+from habits.ratelimit import get_rate_limiter
+from habits.services import get_due_habits
+
+
+class Command(BaseCommand):
+    help = "Sends reminders of the given habits or of all habits which reminders are due now."
+
+    def add_arguments(self, parser):
+        parser.add_argument("habits", nargs="*", type=int, help="Habit pks. Due habits are taken if omitted.")
+        parser.add_argument("--max-in-flight", type=int, default=TELEGRAM_MAX_IN_FLIGHT)
+
+    def handle(self, *args, **kwargs):
+        pks = kwargs["habits"] or get_due_habits(timezone.now())
+        started = time.perf_counter()
+        reminders, skipped = load_reminders(pks)
+        outcomes = skipped + deliver_reminders(reminders, kwargs["max_in_flight"])
+        elapsed = time.perf_counter() - started
+
+        for status, count in Counter(outcome["status"] for outcome in outcomes).items():
+            self.stdout.write(f"{status}: {count}")
+        for name, value in get_rate_limiter().metrics().items():
+            self.stdout.write(f"rate limiter {name}: {value}")
+        self.stdout.write(self.style.SUCCESS(f"{len(outcomes)} reminders processed in {elapsed:.2f} s."))
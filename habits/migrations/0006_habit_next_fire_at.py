@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:19
+
+from datetime import datetime, time, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# A frozen copy of the crontab calculation of habits.schedules, so that later changes of the app don't change
+# this migration.
+DAY_NAMES = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+
+
+def parse_value(value, names=None):
+    if names is None:
+        return int(value)
+    return names[value] if value in names else int(value) % 7
+
+
+def parse_field(field, min_value, max_value, names=None):
+    size = max_value - min_value + 1
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = min_value, max_value
+        else:
+            first, _, last = part.partition("-")
+            start = parse_value(first, names)
+            end = parse_value(last, names) if last else (max_value if step > 1 else start)
+        if step < 1 or not min_value <= start <= max_value or not min_value <= end <= max_value:
+            raise ValueError(f"Invalid crontab field {field!r}.")
+        count = (end - start) % size + 1
+        values.update(min_value + (start - min_value + i) % size for i in range(0, count, step))
+    return sorted(values)
+
+
+def get_next_fire_at(crontab, after):
+    """Returns the first moment after the given one when the crontab fires, None if there's none in 5 years."""
+    minute, hour, day_of_month, month_of_year, day_of_week = crontab.split()
+    minutes, hours = parse_field(minute, 0, 59), parse_field(hour, 0, 23)
+    days_of_month, months = set(parse_field(day_of_month, 1, 31)), set(parse_field(month_of_year, 1, 12))
+    days_of_week = set(parse_field(day_of_week.lower(), 0, 6, DAY_NAMES))
+    after = timezone.localtime(after).replace(second=0, microsecond=0)
+    day = after.date()
+    for _ in range(366 * 5):
+        if day.month in months and day.day in days_of_month and day.isoweekday() % 7 in days_of_week:
+            for hour in hours:
+                for minute in minutes:
+                    moment = timezone.make_aware(datetime.combine(day, time(hour, minute)))
+                    if moment > after:
+                        return moment
+        day += timedelta(days=1)
+    return None
+
+
+def fill_next_fire_at(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    habits = Habit.objects.filter(is_pleasant=False, frequency__isnull=False).only("pk", "frequency")
+    now = timezone.now()
+    for habit in habits.iterator():
+        try:
+            habit.next_fire_at = get_next_fire_at(habit.frequency, now)
+        except (KeyError, ValueError):
+            continue
+        habit.save(update_fields=["next_fire_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0005_alter_habit_frequency"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="next_fire_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Time when the next reminder should be sent. Calculated for good habits only.",
+                null=True,
+                verbose_name="next reminder time",
+            ),
+        ),
+        migrations.RunPython(fill_next_fire_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0006_habit_next_fire_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="habit",
+            name="next_fire_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Time when the next reminder should be sent. Calculated for good habits only.",
+                null=True,
+                verbose_name="next reminder time",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(fields=["user", "id"], name="habit_user_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(condition=models.Q(("is_public", True)), fields=["id"], name="habit_public_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("is_pleasant", False)), fields=["next_fire_at"], name="habit_good_next_fire_at_idx"
+            ),
+        ),
+    ]
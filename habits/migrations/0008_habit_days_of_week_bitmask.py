@@ -0,0 +1,61 @@
+from django.db import migrations, models
+
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def days_to_bitmask(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    masks = {}
+    for habit_id, day in Habit.days_of_week.through.objects.values_list("habit_id", "week__day"):
+        if day in WEEKDAY_NAMES:
+            masks[habit_id] = masks.get(habit_id, 0) | 1 << WEEKDAY_NAMES.index(day)
+    habits = [Habit(pk=pk, weekdays=mask) for pk, mask in masks.items()]
+    Habit.objects.bulk_update(habits, ["weekdays"], batch_size=1000)
+
+
+def bitmask_to_days(apps, schema_editor):
+    Habit = apps.get_model("habits", "Habit")
+    Week = apps.get_model("habits", "Week")
+    weeks = {week.day: week.pk for week in Week.objects.all()}
+    links = [
+        Habit.days_of_week.through(habit_id=pk, week_id=weeks[day])
+        for pk, mask in Habit.objects.exclude(weekdays=0).values_list("pk", "weekdays")
+        for i, day in enumerate(WEEKDAY_NAMES)
+        if mask & 1 << i and day in weeks
+    ]
+    Habit.days_of_week.through.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0007_habit_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="weekdays",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(days_to_bitmask, bitmask_to_days),
+        migrations.RemoveField(
+            model_name="habit",
+            name="days_of_week",
+        ),
+        migrations.RenameField(
+            model_name="habit",
+            old_name="weekdays",
+            new_name="days_of_week",
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="days_of_week",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                default=0,
+                help_text="Select specific days when a good habit should be performed.",
+                verbose_name="day(s) of week",
+            ),
+        ),
+    ]
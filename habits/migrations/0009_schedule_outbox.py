@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0008_habit_days_of_week_bitmask"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleOutbox",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("habit_id", models.BigIntegerField(verbose_name="habit id")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="created at")),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:36
+
+from django.db import migrations
+
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def create_weeks(apps, schema_editor):
+    """Restores the weekdays of the fixture, so that reversing 0008 can link habits to them again."""
+    Week = apps.get_model("habits", "Week")
+    Week.objects.bulk_create(Week(pk=i, day=day) for i, day in enumerate(WEEKDAY_NAMES, start=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_schedule_outbox"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_weeks),
+        migrations.DeleteModel(
+            name="Week",
+        ),
+    ]
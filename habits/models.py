@@ -3,11 +3,8 @@ from django.db import models
 from config.settings import HABIT_FREQUENCY
 from users.models import User
 
-
-class Week(models.Model):
-    """Model for storaging days of week."""
-
-    day = models.CharField(max_length=3, verbose_name="day of week")
+# Bit i of Habit.days_of_week stands for the day WEEKDAY_NAMES[i], days are numbered from 1 (Monday) in the API.
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
 
 
 class Habit(models.Model):
@@ -62,11 +59,10 @@ class Habit(models.Model):
         null=True,
         blank=True,
     )
-    days_of_week = models.ManyToManyField(
-        Week,
+    days_of_week = models.PositiveSmallIntegerField(
         verbose_name="day(s) of week",
         help_text="Select specific days when a good habit should be performed.",
-        null=True,
+        default=0,
         blank=True,
     )
     time_needed = models.PositiveIntegerField(
@@ -76,3 +72,27 @@ class Habit(models.Model):
     is_public = models.BooleanField(
         verbose_name="public or not", help_text="Select whether you want other users see your habit."
     )
+    next_fire_at = models.DateTimeField(
+        verbose_name="next reminder time",
+        help_text="Time when the next reminder should be sent. Calculated for good habits only.",
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "id"], name="habit_user_id_idx"),
+            models.Index(fields=["id"], condition=models.Q(is_public=True), name="habit_public_id_idx"),
+            models.Index(
+                fields=["next_fire_at"], condition=models.Q(is_pleasant=False), name="habit_good_next_fire_at_idx"
+            ),
+        ]
+
+
+class ScheduleOutbox(models.Model):
+    """Habits which reminder tasks should be synced, recorded in the transaction that changed the habit. The habit is
+    referenced by id only, so that deleted habits can still be synced."""
+
+    habit_id = models.BigIntegerField(verbose_name="habit id")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="created at")
@@ -1,7 +1,27 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+from config.settings import HABIT_PAGINATION
 
 
 class HabitPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class HabitCursorPagination(CursorPagination):
+    """Keyset pagination by primary key: no COUNT(*) and no OFFSET scan, so every page costs the same."""
+
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 10
+    # "id" rather than "pk", so that rows fetched with values() can be paged too.
+    ordering = "id"
+
+
+def select_pagination_class(request, pagination_class: type[BasePagination] | None) -> type[BasePagination] | None:
+    """Returns cursor pagination if it's selected via the "pagination" query parameter or in settings,
+    otherwise the view's own pagination class."""
+    if request.query_params.get("pagination", HABIT_PAGINATION) == "cursor":
+        return HabitCursorPagination
+    return pagination_class
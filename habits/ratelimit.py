@@ -0,0 +1,137 @@
+import threading
+import time
+
+import redis
+
+from config.settings import (TELEGRAM_CHAT_RATE, TELEGRAM_GLOBAL_RATE, TELEGRAM_RATE_LIMIT_BACKEND,
+                             TELEGRAM_RATE_LIMIT_REDIS_URL)
+
+# Both buckets are kept as a "theoretical arrival time" (GCRA): the moment when the bucket is full again.
+# A reservation takes a token from both buckets and returns how long to wait for it. The global token is taken
+# from the moment the bot may send again, not from the moment the chat may, so that a busy chat doesn't hold
+# back messages to other chats.
+RESERVE_SCRIPT = """
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local global_interval, global_tolerance = tonumber(ARGV[1]), tonumber(ARGV[2])
+local chat_interval, chat_tolerance = tonumber(ARGV[3]), tonumber(ARGV[4])
+local global_tat = tonumber(redis.call("GET", KEYS[1]) or now)
+local chat_tat = tonumber(redis.call("GET", KEYS[2]) or now)
+local blocked_until = tonumber(redis.call("GET", KEYS[3]) or now)
+local start = math.max(now, global_tat - global_tolerance, chat_tat - chat_tolerance, blocked_until)
+global_tat = math.max(global_tat, now, blocked_until) + global_interval
+chat_tat = math.max(chat_tat, start) + chat_interval
+redis.call("SET", KEYS[1], tostring(global_tat), "PX", math.ceil((global_tat - now) * 1000) + 1000)
+redis.call("SET", KEYS[2], tostring(chat_tat), "PX", math.ceil((chat_tat - now) * 1000) + 1000)
+redis.call("HINCRBY", KEYS[4], "reservations", 1)
+if start > now then
+    redis.call("HINCRBY", KEYS[4], "delayed", 1)
+    redis.call("HINCRBYFLOAT", KEYS[4], "wait_seconds", tostring(start - now))
+end
+return tostring(start - now)
+"""
+
+BLOCK_SCRIPT = """
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local blocked_until = math.max(tonumber(redis.call("GET", KEYS[1]) or now), now + tonumber(ARGV[1]))
+redis.call("SET", KEYS[1], tostring(blocked_until), "PX", math.ceil((blocked_until - now) * 1000) + 1000)
+redis.call("HINCRBY", KEYS[2], "throttled", 1)
+"""
+
+
+class MemoryRateLimiter:
+    """Global and per-chat token buckets kept in the memory of the process. Not shared between processes, so it
+    should only be used for tests and local runs."""
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, chat_rate: float = TELEGRAM_CHAT_RATE):
+        self.global_interval, self.global_tolerance = 1 / global_rate, (max(global_rate, 1) - 1) / global_rate
+        self.chat_interval, self.chat_tolerance = 1 / chat_rate, (max(chat_rate, 1) - 1) / chat_rate
+        self.global_tat = 0.0
+        self.chat_tats = {}
+        self.blocked_until = 0.0
+        self.stats = {"reservations": 0, "delayed": 0, "wait_seconds": 0.0, "throttled": 0}
+        self.lock = threading.Lock()
+
+    def reserve(self, chat_id: str) -> float:
+        """Takes a token for a message to the chat. Returns the number of seconds to wait before sending it."""
+        with self.lock:
+            now = time.monotonic()
+            chat_tat = self.chat_tats.get(chat_id, now)
+            start = max(
+                now, self.global_tat - self.global_tolerance, chat_tat - self.chat_tolerance, self.blocked_until
+            )
+            self.global_tat = max(self.global_tat, now, self.blocked_until) + self.global_interval
+            self.chat_tats[chat_id] = max(chat_tat, start) + self.chat_interval
+            if len(self.chat_tats) > 10000:
+                self.chat_tats = {chat: tat for chat, tat in self.chat_tats.items() if tat > now}
+            self.stats["reservations"] += 1
+            if start > now:
+                self.stats["delayed"] += 1
+                self.stats["wait_seconds"] += start - now
+            return start - now
+
+    def block(self, seconds: float) -> None:
+        """Stops all sending for the number of seconds Telegram asked to wait in a 429 response."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.stats["throttled"] += 1
+
+    def metrics(self) -> dict:
+        """Returns counters of reservations, delayed reservations, total wait time and 429 responses."""
+        with self.lock:
+            return dict(self.stats)
+
+
+class RedisRateLimiter:
+    """Global and per-chat token buckets shared by all worker processes through Redis."""
+
+    prefix = "telegram-rate-limit"
+
+    def __init__(
+        self,
+        url: str = TELEGRAM_RATE_LIMIT_REDIS_URL,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+    ):
+        self.client = redis.Redis.from_url(url)
+        self.reserve_script = self.client.register_script(RESERVE_SCRIPT)
+        self.block_script = self.client.register_script(BLOCK_SCRIPT)
+        self.args = (
+            1 / global_rate,
+            (max(global_rate, 1) - 1) / global_rate,
+            1 / chat_rate,
+            (max(chat_rate, 1) - 1) / chat_rate,
+        )
+
+    def reserve(self, chat_id: str) -> float:
+        """Takes a token for a message to the chat. Returns the number of seconds to wait before sending it."""
+        keys = (
+            f"{self.prefix}:global",
+            f"{self.prefix}:chat:{chat_id}",
+            f"{self.prefix}:blocked",
+            f"{self.prefix}:metrics",
+        )
+        return float(self.reserve_script(keys=keys, args=self.args))
+
+    def block(self, seconds: float) -> None:
+        """Stops all sending for the number of seconds Telegram asked to wait in a 429 response."""
+        self.block_script(keys=(f"{self.prefix}:blocked", f"{self.prefix}:metrics"), args=(seconds,))
+
+    def metrics(self) -> dict:
+        """Returns counters of reservations, delayed reservations, total wait time and 429 responses."""
+        stats = {"reservations": 0, "delayed": 0, "wait_seconds": 0.0, "throttled": 0}
+        for key, value in self.client.hgetall(f"{self.prefix}:metrics").items():
+            stats[key.decode()] = float(value) if key == b"wait_seconds" else int(value)
+        return stats
+
+
+rate_limiter = None
+
+
+def get_rate_limiter() -> MemoryRateLimiter | RedisRateLimiter:
+    """Returns the rate limiter of the backend selected in settings."""
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RedisRateLimiter() if TELEGRAM_RATE_LIMIT_BACKEND == "redis" else MemoryRateLimiter()
+    return rate_limiter
@@ -0,0 +1,56 @@
+import datetime
+
+from celery.utils.log import get_logger
+from django.utils.timezone import now
+from django_celery_beat.schedulers import SCHEDULE_SYNC_MAX_INTERVAL, DatabaseScheduler
+
+logger = get_logger(__name__)
+
+# Tasks changed a bit before the last read are read again, so that changes saved by hosts with clocks slightly
+# behind are not missed.
+CLOCK_SKEW = datetime.timedelta(seconds=30)
+
+
+class IncrementalDatabaseScheduler(DatabaseScheduler):
+    """Database scheduler that applies changed periodic tasks to the loaded schedule instead of reloading all of
+    them on every change. Tasks saved since the last read are fetched by their date_changed, deleted and disabled
+    ones are dropped by name. The schedule is still reloaded in full every SCHEDULE_SYNC_MAX_INTERVAL seconds."""
+
+    _last_read_at = None
+
+    def all_as_schedule(self):
+        # Remember the last change on the initial read too, so that the first change after it is not missed.
+        self._last_timestamp = self.Changes.last_change()
+        self._last_read_at = now()
+        return super().all_as_schedule()
+
+    def apply_changes(self) -> None:
+        """Rebuilds entries of the tasks changed since the last read and drops entries of removed tasks."""
+        since, self._last_read_at = self._last_read_at - CLOCK_SKEW, now()
+        queryset = self.enabled_models_qs()
+        names = set(queryset.values_list("name", flat=True))
+        removed = [name for name in self._schedule if name not in names]
+        for name in removed:
+            del self._schedule[name]
+        changed = 0
+        for model in queryset.filter(date_changed__gte=since):
+            try:
+                self._schedule[model.name] = self.Entry(model, app=self.app)
+            except ValueError:
+                self._schedule.pop(model.name, None)
+            changed += 1
+        if removed or changed:
+            self._heap = []
+            self._heap_invalidated = True
+        logger.info("IncrementalDatabaseScheduler: %d task(s) changed, %d removed.", changed, len(removed))
+
+    @property
+    def schedule(self):
+        if self._initial_read or self._last_read_at is None:
+            return super().schedule
+        if (datetime.datetime.now() - self._last_full_sync).total_seconds() >= SCHEDULE_SYNC_MAX_INTERVAL:
+            return super().schedule
+        if self.schedule_changed():
+            self.sync()
+            self.apply_changes()
+        return self._schedule
@@ -0,0 +1,115 @@
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+from django.utils import timezone
+
+from config.settings import HABIT_FREQUENCY
+
+PLACEHOLDERS = "mxyzhd"
+
+DAY_NAMES = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+
+
+class FrequencyTemplate:
+    """Frequency with placeholders (see settings.HABIT_FREQUENCY) compiled into crontab fields. A placeholder is a
+    single letter between field separators, so it's rendered by its position and never inside a day name."""
+
+    def __init__(self, template: str):
+        self.fields = tuple(
+            tuple(token for token in re.split(r"([-,/])", field) if token) for field in template.split()
+        )
+
+    def render(self, replacements: dict[str, str]) -> str:
+        """Renders crontab replacing placeholders with values."""
+        return " ".join(
+            "".join(
+                replacements.get(token, token) if len(token) == 1 and token in PLACEHOLDERS else token
+                for token in field
+            )
+            for field in self.fields
+        )
+
+
+@lru_cache(maxsize=256)
+def compile_frequency(frequency: str) -> FrequencyTemplate:
+    """Returns compiled frequency template."""
+    return FrequencyTemplate(frequency)
+
+
+def parse_value(value: str, names: dict[str, int] | None = None) -> int:
+    """Parses a single crontab value, day of week names and 7 for Sunday are allowed for days of week."""
+    if names is None:
+        return int(value)
+    return names[value] if value in names else int(value) % 7
+
+
+def parse_field(field: str, min_value: int, max_value: int, names: dict[str, int] | None = None) -> tuple[int, ...]:
+    """Parses a crontab field ("*", "*/2", "9-18/3", "mon,tue" etc) into sorted allowed values."""
+    size = max_value - min_value + 1
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = min_value, max_value
+        else:
+            first, _, last = part.partition("-")
+            start = parse_value(first, names)
+            end = parse_value(last, names) if last else (max_value if step > 1 else start)
+        if step < 1 or not min_value <= start <= max_value or not min_value <= end <= max_value:
+            raise ValueError(f"Invalid crontab field {field!r}.")
+        # Ranges like 22-2 wrap around.
+        count = (end - start) % size + 1
+        values.update(min_value + (start - min_value + i) % size for i in range(0, count, step))
+    return tuple(sorted(values))
+
+
+class CronSchedule:
+    """Crontab compiled into sorted allowed values of every field. Days must match both the day of month and the
+    day of week, as in Celery beat."""
+
+    def __init__(self, crontab: str):
+        minute, hour, day_of_month, month_of_year, day_of_week = crontab.split()
+        self.minutes = parse_field(minute, 0, 59)
+        self.hours = parse_field(hour, 0, 23)
+        self.days_of_month = frozenset(parse_field(day_of_month, 1, 31))
+        self.months = frozenset(parse_field(month_of_year, 1, 12))
+        self.days_of_week = frozenset(parse_field(day_of_week.lower(), 0, 6, DAY_NAMES))
+
+    def matches_day(self, day: date) -> bool:
+        return day.month in self.months and day.day in self.days_of_month and day.isoweekday() % 7 in self.days_of_week
+
+    def is_due(self, moment: datetime) -> bool:
+        """Checks whether the crontab fires in the minute of the moment."""
+        moment = timezone.localtime(moment)
+        return moment.minute in self.minutes and moment.hour in self.hours and self.matches_day(moment.date())
+
+    def next_fire_times(self, after: datetime, n: int = 1) -> list[datetime]:
+        """Returns the next n moments after the given one when the crontab fires (in the current timezone)."""
+        after = timezone.localtime(after).replace(second=0, microsecond=0)
+        fire_times = []
+        day = after.date()
+        for _ in range(366 * 5):
+            if self.matches_day(day):
+                for hour in self.hours:
+                    if day == after.date() and hour < after.hour:
+                        continue
+                    for minute in self.minutes:
+                        moment = timezone.make_aware(datetime.combine(day, time(hour, minute)))
+                        if moment > after:
+                            fire_times.append(moment)
+                            if len(fire_times) == n:
+                                return fire_times
+            day += timedelta(days=1)
+        return fire_times
+
+
+@lru_cache(maxsize=1024)
+def compile_crontab(crontab: str) -> CronSchedule:
+    """Returns compiled crontab."""
+    return CronSchedule(crontab)
+
+
+for frequency, _ in HABIT_FREQUENCY:
+    compile_frequency(frequency)
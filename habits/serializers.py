@@ -1,23 +1,71 @@
 from rest_framework import serializers
 
-from habits.models import Habit
+from habits.models import WEEKDAY_NAMES, Habit
 from habits.validators import HabitValidator
 
+# Related fields of habits copied from the instance by their ids.
+RELATED_FIELDS = {"user": "user_id", "related_habit": "related_habit_id"}
+
+
+class DaysOfWeekField(serializers.Field):
+    """Represents the days of week bitmask as a list of days from 1 (Monday) to 7 (Sunday)."""
+
+    def to_representation(self, value):
+        return [i + 1 for i in range(len(WEEKDAY_NAMES)) if value & 1 << i]
+
+    default_error_messages = {
+        "not_a_list": 'Expected a list of days but got type "{input_type}".',
+        "invalid_day": "Invalid day of week {day}.",
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (list, tuple)):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        mask = 0
+        for day in data:
+            if isinstance(day, bool) or not str(day).isdigit() or not 1 <= int(day) <= len(WEEKDAY_NAMES):
+                self.fail("invalid_day", day=day)
+            mask |= 1 << int(day) - 1
+        return mask
+
 
 class HabitSerializer(serializers.ModelSerializer):
+    days_of_week = DaysOfWeekField(required=False)
 
     class Meta:
         model = Habit
-        fields = "__all__"
+        fields = (
+            "id",
+            "place",
+            "time",
+            "action",
+            "is_pleasant",
+            "frequency",
+            "reward",
+            "end_time",
+            "time_needed",
+            "is_public",
+            "user",
+            "related_habit",
+            "days_of_week",
+        )
         validators = [HabitValidator()]
 
     def to_internal_value(self, data):
+        """Returns the data as is with days of week converted to the bitmask. Fields missing in an update are taken
+        from the instance, related objects are taken by their ids to avoid loading them."""
+        if "days_of_week" in data:
+            try:
+                data["days_of_week"] = self.fields["days_of_week"].to_internal_value(data["days_of_week"])
+            except serializers.ValidationError as e:
+                raise serializers.ValidationError({"days_of_week": e.detail})
         if self.instance:
             if not data.get("days_of_week"):
-                data["days_of_week"] = [day.pk for day in self.instance.days_of_week.all()]
-            for field in self.fields.keys():
-                if field not in data.keys():
-                    data[field] = getattr(self.instance, field)
+                data["days_of_week"] = self.instance.days_of_week
+            for field in self.fields:
+                attname = RELATED_FIELDS.get(field, field)
+                if field not in data and attname not in data:
+                    data[attname] = getattr(self.instance, attname)
         return data
 
 
@@ -26,3 +74,34 @@ class PublicHabitSerializer(serializers.ModelSerializer):
     class Meta:
         model = Habit
         fields = ("action", "is_pleasant", "time_needed")
+
+
+# Columns fetched for the fast read path, see serialize_habit_rows.
+HABIT_VALUES = HabitSerializer.Meta.fields[:-3] + ("user_id", "related_habit_id", "days_of_week")
+
+# Days of week of every bitmask, so that masks aren't converted for every habit.
+DAYS_OF_WEEK = tuple(tuple(DaysOfWeekField().to_representation(mask)) for mask in range(1 << len(WEEKDAY_NAMES)))
+
+
+def serialize_habit_rows(rows: list[dict]) -> list[dict]:
+    """Serializes habits fetched with values(*HABIT_VALUES) into the same data as HabitSerializer, without the
+    overhead of a serializer field per value."""
+    datetime_to_representation = serializers.DateTimeField().to_representation
+    return [
+        {
+            "id": row["id"],
+            "place": row["place"],
+            "time": datetime_to_representation(row["time"]),
+            "action": row["action"],
+            "is_pleasant": row["is_pleasant"],
+            "frequency": row["frequency"],
+            "reward": row["reward"],
+            "end_time": datetime_to_representation(row["end_time"]),
+            "time_needed": row["time_needed"],
+            "is_public": row["is_public"],
+            "user": row["user_id"],
+            "related_habit": row["related_habit_id"],
+            "days_of_week": list(DAYS_OF_WEEK[row["days_of_week"]]),
+        }
+        for row in rows
+    ]
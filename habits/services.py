@@ -1,38 +1,146 @@
 import json
-from datetime import datetime
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
 
-from django_celery_beat.models import CrontabSchedule, PeriodicTask
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, F, Q, QuerySet, When
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+from django_celery_beat.models import CrontabSchedule, PeriodicTask, PeriodicTasks
 
-from habits.models import Habit
+from config.instrumentation import phase
+from config.settings import SCHEDULE_CACHE_ENABLED, SCHEDULE_CACHE_SIZE
+from habits.models import WEEKDAY_NAMES, Habit, ScheduleOutbox
+from habits.schedules import compile_crontab, compile_frequency
 
 
 def create_replacements(habit: Habit) -> dict[str, str | list[str]]:
     """Renders a dict of replacements."""
-    m = datetime.fromisoformat(habit.time).time().minute
-    h = x = datetime.fromisoformat(habit.time).time().hour
-    y = datetime.fromisoformat(habit.end_time).time().hour if habit.end_time else 0
-    z = (x + y) // 2
-    d = ",".join([day.day for day in habit.days_of_week.all()]) if habit.days_of_week else "d"
-    return {"m": str(m), "x": str(x), "y": str(y), "z": str(z), "h": str(h), "d": d}
+    start = timezone.localtime(habit.time) if isinstance(habit.time, datetime) else datetime.fromisoformat(habit.time)
+    m, h = start.minute, start.hour
+    if habit.end_time:
+        end = habit.end_time
+        y = (timezone.localtime(end) if isinstance(end, datetime) else datetime.fromisoformat(end)).hour
+    else:
+        y = 0
+    z = (h + y) // 2
+    d = ",".join(day for i, day in enumerate(WEEKDAY_NAMES) if habit.days_of_week & 1 << i) or "d"
+    return {"m": str(m), "x": str(h), "y": str(y), "z": str(z), "h": str(h), "d": d}
 
 
-def make_replacements(text: str, replacements: dict) -> str:
-    """Replaces vars in text with correct values."""
-    for k, v in replacements.items():
-        text = text.replace(k, v)
-    return text
-
-
-def create_schedule(crontab: str) -> CrontabSchedule:
-    """Creates schedule to send reminders."""
-    minute, hour, day_of_month, month_of_year, day_of_week = crontab.split()
-    schedule, created = CrontabSchedule.objects.get_or_create(
-        minute=minute,
-        hour=hour,
-        day_of_week=day_of_week,
-        day_of_month=day_of_month,
-        month_of_year=month_of_year,
+def create_reminder_text(habit: Habit) -> str:
+    """Renders the text of a reminder."""
+    return (
+        f"It's time to do {habit.action} at {habit.place}! "
+        f"Don't forget to {habit.reward if habit.reward else habit.related_habit} afterwards."
     )
+
+
+def make_replacements(text: str, replacements: dict) -> str:
+    """Replaces vars in text with correct values by their positions in the compiled frequency template."""
+    return compile_frequency(text).render(replacements)
+
+
+SCHEDULE_CACHE_VERSION_KEY = "crontab-schedules-version"
+
+
+class ScheduleCache:
+    """Bounded LRU cache of CrontabSchedule ids keyed by (minute, hour, day of month, month, day of week). A deleted
+    schedule changes the version of schedules kept in the shared cache, which drops the ids cached by every process
+    on their next version check, so that a deleted schedule is never handed out."""
+
+    def __init__(self, maxsize: int = SCHEDULE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.ids = OrderedDict()
+        self.version = None
+        self.hits = self.misses = 0
+        self.lock = threading.RLock()
+
+    def check_version(self) -> None:
+        """Drops cached ids if a schedule was deleted by any process since the last check."""
+        version = cache.get_or_set(SCHEDULE_CACHE_VERSION_KEY, time.time_ns, timeout=None)
+        with self.lock:
+            if version != self.version:
+                self.ids.clear()
+                self.version = version
+
+    def get(self, key: tuple) -> int | None:
+        with self.lock:
+            pk = self.ids.get(key)
+            if pk is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.ids.move_to_end(key)
+            return pk
+
+    def set(self, key: tuple, pk: int) -> None:
+        with self.lock:
+            self.ids[key] = pk
+            self.ids.move_to_end(key)
+            if len(self.ids) > self.maxsize:
+                self.ids.popitem(last=False)
+
+    def evict(self, pk: int) -> None:
+        """Removes a deleted schedule from the cache and makes other processes drop their cached ids."""
+        with self.lock:
+            for key in [key for key, cached_pk in self.ids.items() if cached_pk == pk]:
+                del self.ids[key]
+        cache.set(SCHEDULE_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.ids.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> dict[str, int]:
+        """Returns hit and miss counters and the size of the cache."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "maxsize": self.maxsize, "currsize": len(self.ids)}
+
+
+schedule_cache = ScheduleCache()
+
+
+def create_schedule(crontab: str, check_version: bool = True) -> CrontabSchedule:
+    """Creates schedule to send reminders. With a shared cache (SCHEDULE_CACHE_ENABLED) ids of known schedules are
+    taken from the cache without a query, the returned schedule then only has its crontab fields set. Callers
+    creating schedules in bulk check the version of cached ids once beforehand and pass check_version=False."""
+    minute, hour, day_of_month, month_of_year, day_of_week = key = tuple(crontab.split())
+    fields = {
+        "minute": minute,
+        "hour": hour,
+        "day_of_week": day_of_week,
+        "day_of_month": day_of_month,
+        "month_of_year": month_of_year,
+    }
+    if not SCHEDULE_CACHE_ENABLED:
+        return get_or_create_schedule(fields)
+    if check_version:
+        schedule_cache.check_version()
+    pk = schedule_cache.get(key)
+    if pk is not None:
+        return CrontabSchedule(pk=pk, **fields)
+    with schedule_cache.lock:
+        pk = schedule_cache.ids.get(key)
+        if pk is not None:
+            return CrontabSchedule(pk=pk, **fields)
+        schedule = get_or_create_schedule(fields)
+        # A schedule created in a transaction that is rolled back afterwards must not get into the cache.
+        transaction.on_commit(lambda: schedule_cache.set(key, schedule.pk))
+    return schedule
+
+
+def get_or_create_schedule(fields: dict[str, str]) -> CrontabSchedule:
+    """Returns the crontab schedule with the fields, a missing one is created. There is no unique constraint on
+    crontab fields, so schedules created concurrently by other processes may be duplicated. The oldest one is always
+    taken to keep all processes on the same schedule."""
+    schedule = CrontabSchedule.objects.filter(**fields).order_by("pk").first()
+    if schedule is None:
+        schedule = CrontabSchedule.objects.create(**fields)
     return schedule
 
 
@@ -44,3 +152,197 @@ def create_task(schedule: CrontabSchedule, habit: Habit) -> None:
         task="habits.tasks.send_message",
         args=json.dumps([habit.pk]),
     )
+
+
+def delete_periodic_tasks(tasks: QuerySet) -> int:
+    """Deletes period tasks with a single query and returns their number. Unlike QuerySet.delete(), django-celery-beat
+    signals are not sent, they rewrite the PeriodicTasks row once per task, so callers notify beat themselves."""
+    return tasks._raw_delete(tasks.db)
+
+
+def delete_reminder_tasks(pks: list[int]) -> int:
+    """Deletes period tasks of the habits with a single query, beat is notified once. Returns the number of deleted
+    tasks."""
+    deleted = delete_periodic_tasks(PeriodicTask.objects.filter(name__in=[f"Sending reminder {pk}" for pk in pks]))
+    if deleted:
+        PeriodicTasks.update_changed()
+    return deleted
+
+
+def sync_reminder_tasks(habits: list[Habit]) -> int:
+    """Creates or updates period tasks of good habits with a telegram chat in bulk. Only tasks which schedule
+    changed are saved and beat is notified once. Returns the number of created and updated tasks."""
+    habits = {
+        f"Sending reminder {habit.pk}": habit
+        for habit in habits
+        if not habit.is_pleasant and habit.frequency and habit.user and habit.user.tg_chat_id
+    }
+    tasks = {task.name: task for task in PeriodicTask.objects.filter(name__in=habits)}
+    new_tasks, changed_tasks = [], []
+    if SCHEDULE_CACHE_ENABLED:
+        schedule_cache.check_version()
+    for name, habit in habits.items():
+        schedule = create_schedule(habit.frequency, check_version=False)
+        task = tasks.get(name)
+        if task is None:
+            task = PeriodicTask(
+                crontab=schedule, name=name, task="habits.tasks.send_message", args=json.dumps([habit.pk])
+            )
+            new_tasks.append(task)
+        elif task.crontab_id != schedule.pk or not task.enabled:
+            task.crontab = schedule
+            task.enabled = True
+            task.date_changed = timezone.now()
+            changed_tasks.append(task)
+    PeriodicTask.objects.bulk_create(new_tasks)
+    PeriodicTask.objects.bulk_update(changed_tasks, ("crontab", "enabled", "date_changed"))
+    if new_tasks or changed_tasks:
+        PeriodicTasks.update_changed()
+    return len(new_tasks) + len(changed_tasks)
+
+
+def reconcile_habits(habits: list[Habit], sync_tasks: bool = True) -> Counter:
+    """Repairs good habits in bulk: renders frequencies left with placeholders, recalculates missing or passed next
+    reminder times and syncs reminder tasks. Returns counts of checked, invalid and repaired habits and tasks."""
+    now = timezone.now()
+    counts = Counter(checked=len(habits))
+    valid, changed = [], []
+    for habit in habits:
+        if not habit.frequency:
+            counts["invalid"] += 1
+            continue
+        try:
+            frequency = make_replacements(habit.frequency, create_replacements(habit))
+            compile_crontab(frequency)
+        except (TypeError, ValueError):
+            counts["invalid"] += 1
+            continue
+        valid.append(habit)
+        if frequency != habit.frequency or habit.next_fire_at is None or habit.next_fire_at < now:
+            counts["frequencies repaired"] += frequency != habit.frequency
+            habit.frequency = frequency
+            habit.next_fire_at = get_next_fire_at(frequency, now)
+            changed.append(habit)
+    Habit.objects.bulk_update(changed, ("frequency", "next_fire_at"))
+    counts["habits repaired"] = len(changed)
+    if sync_tasks:
+        counts["tasks repaired"] = sync_reminder_tasks(valid)
+    return counts
+
+
+@phase("schedule")
+def render_schedule(data: dict) -> dict:
+    """Renders the frequency of a good habit from its validated data and calculates the next reminder time, so that
+    the habit is saved once."""
+    habit = Habit(time=data.get("time"), end_time=data.get("end_time"), days_of_week=data.get("days_of_week") or 0)
+    frequency = make_replacements(data["frequency"], create_replacements(habit))
+    return {"frequency": frequency, "next_fire_at": get_next_fire_at(frequency)}
+
+
+@phase("save")
+def bulk_save_habits(new_habits: list[Habit], changed_habits: list[Habit], record_changes: bool) -> None:
+    """Inserts and updates habits with a query each and records schedule changes of good habits in the outbox with
+    one more query."""
+    Habit.objects.bulk_create(new_habits)
+    fields = [field.name for field in Habit._meta.concrete_fields if not field.primary_key]
+    Habit.objects.bulk_update(changed_habits, fields)
+    if record_changes:
+        ScheduleOutbox.objects.bulk_create(
+            ScheduleOutbox(habit_id=habit.pk) for habit in new_habits + changed_habits if not habit.is_pleasant
+        )
+    if any(habit.is_public for habit in new_habits) or changed_habits:
+        invalidate_public_habits()
+
+
+def record_schedule_change(habit: Habit) -> None:
+    """Records in the outbox that the reminder task of the habit should be synced."""
+    ScheduleOutbox.objects.create(habit_id=habit.pk)
+
+
+def drain_outbox(batch_size: int) -> int:
+    """Syncs reminder tasks of a batch of habits recorded in the outbox and removes the batch. Repeated changes of
+    a habit are synced once, batches locked by other workers are skipped. Returns the number of events drained."""
+    with transaction.atomic():
+        events = list(ScheduleOutbox.objects.select_for_update(skip_locked=True).order_by("pk")[:batch_size])
+        if not events:
+            return 0
+        sync_reminder_tasks(Habit.objects.select_related("user").filter(pk__in={event.habit_id for event in events}))
+        ScheduleOutbox.objects.filter(pk__in=[event.pk for event in events]).delete()
+    return len(events)
+
+
+def get_next_fire_at(crontab: str, after: datetime | None = None) -> datetime | None:
+    """Returns the first moment after the given one (now by default) when a crontab fires."""
+    fire_times = compile_crontab(crontab).next_fire_times(after or timezone.now())
+    return fire_times[0] if fire_times else None
+
+
+def get_due_habits(moment: datetime) -> list[int]:
+    """Returns pks of good habits which reminders are due by the moment and moves their next reminder time
+    forward, so that every occurrence is dispatched once. Habits performed on selected days are only returned on
+    these days (checked with a bitwise filter in the database)."""
+    weekday = 1 << timezone.localtime(moment).weekday()
+    with transaction.atomic():
+        habits = list(
+            Habit.objects.select_for_update(skip_locked=True, of=("self",))
+            .select_related("user")
+            .filter(is_pleasant=False, next_fire_at__lte=moment)
+            .annotate(weekday_bit=F("days_of_week").bitand(weekday))
+            .annotate(
+                on_weekday=Case(
+                    When(Q(days_of_week=0) | Q(weekday_bit__gt=0), then=True),
+                    default=False,
+                    output_field=BooleanField(),
+                )
+            )
+            .only("pk", "frequency", "next_fire_at", "user__tg_chat_id")
+        )
+        for habit in habits:
+            habit.next_fire_at = get_next_fire_at(habit.frequency, moment)
+        Habit.objects.bulk_update(habits, ["next_fire_at"])
+    return [habit.pk for habit in habits if habit.on_weekday and habit.user and habit.user.tg_chat_id]
+
+
+def get_upcoming_volumes(moment: datetime, minutes: int) -> list[int]:
+    """Returns the number of reminders due in every of the next minutes after the moment."""
+    moment = moment.replace(second=0, microsecond=0)
+    rows = (
+        Habit.objects.filter(
+            is_pleasant=False,
+            next_fire_at__gte=moment + timedelta(minutes=1),
+            next_fire_at__lt=moment + timedelta(minutes=minutes + 1),
+        )
+        .annotate(minute=TruncMinute("next_fire_at"))
+        .values("minute")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    volumes = [0] * minutes
+    for row in rows:
+        volumes[int((row["minute"] - moment).total_seconds() // 60) - 1] += row["count"]
+    return volumes
+
+
+def get_send_delays(count: int, upcoming: list[int], jitter: int) -> list[float]:
+    """Spreads reminders due now over the jitter window. The window is filled up to the level the load of this and
+    the upcoming minutes would have if it was flat, so a quiet minute before a busy one keeps its reminders on time.
+    Returns delays in secs, reminders are never sent before their time."""
+    if not count:
+        return []
+    level = (count + sum(upcoming)) / (60 * (len(upcoming) + 1))
+    spread = min(jitter, count / level)
+    return [i * spread / count for i in range(count)]
+
+
+def get_public_habits_cache_key(request) -> str:
+    """Renders the cache key of a public habits page. The key changes whenever public habits are changed. Pages
+    have absolute next and previous links, so they're cached per scheme and host."""
+    version = cache.get_or_set("public-habits:version", time.time_ns, timeout=None)
+    query = "&".join(f"{k}={v}" for k, values in sorted(request.query_params.lists()) for v in values)
+    origin = f"{request.scheme}://{request.get_host()}"
+    return f"public-habits:{version}:{origin}:{request.accepted_media_type}:{query}"
+
+
+def invalidate_public_habits() -> None:
+    """Makes all cached public habits pages outdated."""
+    cache.set("public-habits:version", time.time_ns(), timeout=None)
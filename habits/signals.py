@@ -0,0 +1,56 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django_celery_beat.models import CrontabSchedule
+
+from habits.models import Habit
+from habits.services import delete_reminder_tasks, invalidate_public_habits, schedule_cache
+
+PUBLIC_FIELDS = {"action", "is_pleasant", "time_needed", "is_public"}
+
+# Pks of habits deleted by the thread since reminder tasks were last deleted, rolled back deletions included.
+deleted_habits = threading.local()
+
+
+@receiver(post_save, sender=Habit)
+def invalidate_public_habits_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Invalidates cached public habits when a public habit is saved. An updated habit might have been public
+    before the update, so updates invalidate the cache too unless they don't touch public fields."""
+    if update_fields is not None and not PUBLIC_FIELDS & set(update_fields):
+        return
+    if instance.is_public or not created:
+        invalidate_public_habits()
+
+
+@receiver(post_delete, sender=Habit)
+def invalidate_public_habits_on_delete(sender, instance, **kwargs):
+    """Invalidates cached public habits when a public habit is deleted."""
+    if instance.is_public:
+        invalidate_public_habits()
+
+
+def delete_reminder_tasks_of_deleted_habits():
+    """Deletes reminder tasks of all habits deleted by the thread. Habits deleted in a rolled back savepoint or
+    transaction still exist, so their tasks are kept."""
+    pks, deleted_habits.pks = getattr(deleted_habits, "pks", set()), set()
+    if pks:
+        delete_reminder_tasks(pks - set(Habit.objects.filter(pk__in=pks).values_list("pk", flat=True)))
+
+
+@receiver(post_delete, sender=Habit)
+def delete_reminder_task_on_delete(sender, instance, **kwargs):
+    """Collects deleted habits, so that reminder tasks of all habits deleted in a transaction (one by one, by a
+    queryset or by a user cascade) are deleted in bulk after the commit. Every deletion registers the callback, so
+    that one survives savepoint rollbacks. The first one run deletes all tasks, the rest have nothing left to do."""
+    if not hasattr(deleted_habits, "pks"):
+        deleted_habits.pks = set()
+    deleted_habits.pks.add(instance.pk)
+    transaction.on_commit(delete_reminder_tasks_of_deleted_habits)
+
+
+@receiver(post_delete, sender=CrontabSchedule)
+def evict_schedule_on_delete(sender, instance, **kwargs):
+    """Removes a deleted crontab schedule from the schedule cache."""
+    schedule_cache.evict(instance.pk)
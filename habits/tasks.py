@@ -1,20 +1,59 @@
-import requests
 from celery import shared_task
+from django.utils import timezone
 
-from config.settings import TELEGRAM_BOT_TOKEN
+from config.settings import (HABIT_REMINDER_BATCH_SIZE, HABIT_REMINDER_JITTER, HABIT_REMINDER_MODE,
+                             HABIT_REMINDER_SMOOTHING, SCHEDULE_OUTBOX_BATCH_SIZE)
+from habits.delivery import Reminder, deliver_reminder, deliver_reminders, load_reminders
 from habits.models import Habit
+from habits.services import (create_reminder_text, delete_reminder_tasks, drain_outbox, get_due_habits,
+                             get_next_fire_at, get_send_delays, get_upcoming_volumes)
 
 
 @shared_task
 def send_message(pk) -> None:
-    """Sends reminders to user's telegram."""
-    habit = Habit.objects.get(pk=pk)
-    text = (
-        f"It's time to do {habit.action} at {habit.place}! "
-        f"Don't forget to {habit.reward if habit.reward else habit.related_habit} afterwards."
-    )
-    params = {
-        "text": text,
-        "chat_id": habit.user.tg_chat_id,
-    }
-    requests.get(f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage", params=params)
+    """Sends reminders to user's telegram and moves the next reminder time of the habit forward, as the dispatcher
+    does. The task of a habit that no longer exists is deleted. Does nothing in dispatcher mode, which sends the
+    reminders itself."""
+    if HABIT_REMINDER_MODE == "dispatcher":
+        return
+    habit = Habit.objects.select_related("user", "related_habit").filter(pk=pk).first()
+    if habit is None:
+        delete_reminder_tasks([pk])
+        return
+    deliver_reminder(Reminder(habit.pk, habit.user.tg_chat_id, create_reminder_text(habit)))
+    Habit.objects.filter(pk=pk).update(next_fire_at=get_next_fire_at(habit.frequency))
+
+
+@shared_task
+def send_messages_batch(pks: list[int]) -> list[dict]:
+    """Sends reminders of a batch of habits to users' telegram concurrently and reports the outcome of every
+    message."""
+    reminders, skipped = load_reminders(pks)
+    return skipped + deliver_reminders(reminders)
+
+
+@shared_task
+def dispatch_reminders() -> None:
+    """Sends reminders of all habits due in the current minute in batches (dispatcher mode only). With smoothing on,
+    batches are delayed to flatten the load of busy minutes."""
+    if HABIT_REMINDER_MODE != "dispatcher":
+        return
+    moment = timezone.now()
+    pks = get_due_habits(moment)
+    if HABIT_REMINDER_SMOOTHING:
+        upcoming = get_upcoming_volumes(moment, HABIT_REMINDER_JITTER // 60)
+        delays = get_send_delays(len(pks), upcoming, HABIT_REMINDER_JITTER)
+    else:
+        delays = [0] * len(pks)
+    for start in range(0, len(pks), HABIT_REMINDER_BATCH_SIZE):
+        end = start + HABIT_REMINDER_BATCH_SIZE
+        send_messages_batch.apply_async((pks[start:end],), countdown=delays[start])
+
+
+@shared_task
+def drain_schedule_outbox() -> int:
+    """Syncs reminder tasks of habits changed since the last run in batches. Returns the number of events drained."""
+    drained = 0
+    while count := drain_outbox(SCHEDULE_OUTBOX_BATCH_SIZE):
+        drained += count
+    return drained
@@ -0,0 +1,27 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import (TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_MAX_IN_FLIGHT, TELEGRAM_POOL_SIZE,
+                             TELEGRAM_TIMEOUT)
+
+session = None
+
+
+def get_session() -> requests.Session:
+    """Returns a process-wide session that keeps connections to Telegram alive between reminders."""
+    global session
+    if session is None:
+        pool_size = max(TELEGRAM_POOL_SIZE, TELEGRAM_MAX_IN_FLIGHT)
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return session
+
+
+def send_telegram_message(chat_id: str, text: str) -> requests.Response:
+    """Sends a message to telegram chat."""
+    return get_session().post(
+        f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
+        data={"chat_id": chat_id, "text": text},
+        timeout=TELEGRAM_TIMEOUT,
+    )
@@ -1,8 +1,41 @@
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
+from zoneinfo import ZoneInfo
+
+import requests
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask, PeriodicTasks
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
-from habits.models import Habit, Week
+from config.celery import app
+from config.instrumentation import RequestTimings, current_timings, phase
+from config.parsers import FastJSONParser, MessagePackParser
+from config.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+from habits.delivery import Reminder, deliver_reminders, send_reminder
+from habits.forecast import expand_schedules, load_schedules, np
+from habits.models import Habit, ScheduleOutbox
+from habits.ratelimit import MemoryRateLimiter
+from habits.schedulers import IncrementalDatabaseScheduler
+from habits.schedules import compile_crontab
+from habits.serializers import HABIT_VALUES, HabitSerializer, serialize_habit_rows
+from habits.services import (SCHEDULE_CACHE_VERSION_KEY, create_replacements, create_schedule, create_task,
+                             delete_reminder_tasks, drain_outbox, get_due_habits, get_next_fire_at, get_send_delays,
+                             get_upcoming_volumes, make_replacements, reconcile_habits, record_schedule_change,
+                             schedule_cache, sync_reminder_tasks)
+from habits.tasks import dispatch_reminders, send_message, send_messages_batch
 from users.models import User
 
 
@@ -50,8 +83,6 @@ class HabitTestCase(APITestCase):
             time_needed=30,
             is_public=False,
         )
-        self.mon = Week.objects.create(pk=1, day="mon")
-        self.tue = Week.objects.create(pk=2, day="tue")
         self.client.force_authenticate(user=self.user)
 
     def test_habit_create_good_habit_with_reward(self):
@@ -72,8 +103,153 @@ class HabitTestCase(APITestCase):
 
         self.assertEqual(request.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Habit.objects.all().count(), 5)
-        frequency = Habit.objects.get(place="Place 2").frequency
-        self.assertEqual(frequency, "30 16 * * mon,tue")
+        habit = Habit.objects.get(place="Place 2")
+        self.assertEqual(habit.frequency, "30 16 * * mon,tue")
+        self.assertEqual(habit.days_of_week, 0b11)
+        self.assertEqual(habit.next_fire_at, get_next_fire_at("30 16 * * mon,tue"))
+        self.assertEqual(request.json()["days_of_week"], [1, 2])
+
+    def test_habit_create_records_schedule_change(self):
+        self.user.tg_chat_id = "12345"
+        self.user.save()
+        url = reverse("habits:habit-create")
+        body = {
+            "place": "Place 2",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 2",
+            "is_pleasant": False,
+            "frequency": "m h * * *",
+            "reward": "Reward 2",
+            "time_needed": 90,
+            "is_public": False,
+        }
+        with self.captureOnCommitCallbacks() as callbacks:
+            request = self.client.post(url, body, format="json")
+
+        self.assertEqual(request.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(list(ScheduleOutbox.objects.values_list("habit_id", flat=True)), [request.json()["id"]])
+        self.assertFalse(PeriodicTask.objects.exists())
+
+    def test_habit_bulk(self):
+        url = reverse("habits:habit-bulk")
+        good_habit = {
+            "place": "Place 2",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 2",
+            "is_pleasant": False,
+            "frequency": "m h * * d",
+            "related_habit_id": 2,
+            "time_needed": 90,
+            "days_of_week": [1, 2],
+            "is_public": True,
+        }
+        pleasant_habit = {
+            "place": "Place 3",
+            "action": "Action 3",
+            "is_pleasant": True,
+            "time_needed": 30,
+            "is_public": False,
+        }
+        invalid_habit = {**good_habit, "reward": "Reward 2"}
+        update = {"id": self.good_habit.pk, "place": "Place new", "frequency": "m h * * *"}
+        request = self.client.post(url, [good_habit, pleasant_habit, invalid_habit, update], format="json")
+        response = request.json()
+
+        self.assertEqual(request.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result["status"] for result in response], ["created", "created", "invalid", "updated"])
+        self.assertEqual(response[0]["habit"]["days_of_week"], [1, 2])
+        self.assertEqual(response[2]["errors"]["non_field_errors"][0][:22], "Related habit and rewa")
+        habit = Habit.objects.get(place="Place 2")
+        self.assertEqual((habit.user, habit.related_habit_id), (self.user, 2))
+        self.assertEqual(habit.frequency, "30 16 * * mon,tue")
+        self.assertEqual(habit.next_fire_at, get_next_fire_at("30 16 * * mon,tue"))
+        self.assertEqual(Habit.objects.get(pk=self.good_habit.pk).place, "Place new")
+
+    def test_habit_bulk_constant_queries(self):
+        url = reverse("habits:habit-bulk")
+        self.user.tg_chat_id = "12345"
+        self.user.save()
+        habit = {
+            "place": "Place 2",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 2",
+            "is_pleasant": False,
+            "frequency": "m h * * *",
+            "related_habit_id": 2,
+            "time_needed": 90,
+            "is_public": False,
+        }
+        for count in (1, 10):
+            with CaptureQueriesContext(connection) as queries:
+                request = self.client.post(url, [habit] * count, format="json")
+            self.assertEqual(request.status_code, status.HTTP_201_CREATED)
+            if count == 1:
+                expected = len(queries)
+        self.assertEqual(len(queries), expected)
+        self.assertEqual(ScheduleOutbox.objects.count(), 11)
+
+    def test_habit_bulk_errors(self):
+        url = reverse("habits:habit-bulk")
+        invalid_habit = {"place": "Place", "action": "Action", "is_pleasant": True, "is_public": False}
+        request = self.client.post(url, [{"id": self.pleasant_habit2.pk}, invalid_habit], format="json")
+
+        self.assertEqual(request.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(request.json()[0]["errors"], {"id": ["Habit not found."]})
+        self.assertEqual(request.json()[1]["errors"], {"time_needed": ["This field is required."]})
+        self.assertEqual(self.client.post(url, {"place": "Place"}, format="json").status_code, 400)
+
+    def test_habit_bulk_ids(self):
+        url = reverse("habits:habit-bulk")
+        habit = {"id": str(self.good_habit.pk), "place": "Place 2"}
+        request = self.client.post(url, [{"id": [1]}, {"id": "abc"}, {"id": True}, habit], format="json")
+
+        self.assertEqual(request.status_code, status.HTTP_200_OK)
+        for result in request.json()[:3]:
+            self.assertEqual(result["errors"], {"id": ["A valid integer is required."]})
+        self.assertEqual(request.json()[3]["status"], "updated")
+        self.good_habit.refresh_from_db()
+        self.assertEqual(self.good_habit.place, "Place 2")
+
+    def test_habit_create_invalid_day_of_week_error(self):
+        url = reverse("habits:habit-create")
+        body = {
+            "place": "Place 2",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 2",
+            "is_pleasant": False,
+            "frequency": "m h * * d",
+            "reward": "Reward 2",
+            "time_needed": 90,
+            "days_of_week": [1, 8],
+            "is_public": False,
+        }
+        request = self.client.post(url, body, format="json")
+
+        self.assertEqual(request.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(request.json(), {"days_of_week": ["Invalid day of week 8."]})
+
+    def test_habit_create_days_of_week_not_a_list_error(self):
+        url = reverse("habits:habit-create")
+        body = {
+            "place": "Place 2",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 2",
+            "is_pleasant": False,
+            "frequency": "m h * * d",
+            "reward": "Reward 2",
+            "time_needed": 90,
+            "is_public": False,
+        }
+        for days_of_week, input_type in ((None, "NoneType"), (5, "int"), ("12", "str")):
+            request = self.client.post(url, {**body, "days_of_week": days_of_week}, format="json")
+
+            self.assertEqual(request.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(
+                request.json(), {"days_of_week": [f'Expected a list of days but got type "{input_type}".']}
+            )
+        request = self.client.post(url, {**body, "days_of_week": [True]}, format="json")
+        self.assertEqual(request.json(), {"days_of_week": ["Invalid day of week True."]})
 
     def test_habit_create_good_habit_with_related_habit(self):
         url = reverse("habits:habit-create")
@@ -563,6 +739,62 @@ class HabitTestCase(APITestCase):
             },
         )
 
+    def test_serialize_habit_rows(self):
+        Habit.objects.create(
+            user=self.user,
+            place="Place 2",
+            time="2025-03-30T09:30:00+03:00",
+            action="Action 2",
+            is_pleasant=False,
+            frequency="30 9-18/2 * * mon,wed",
+            related_habit=self.pleasant_habit,
+            end_time="2025-03-30T18:30:00Z",
+            days_of_week=0b101,
+            time_needed=90,
+            is_public=False,
+        )
+        habits = Habit.objects.order_by("pk")
+        renderer = JSONRenderer()
+
+        self.assertEqual(
+            renderer.render(serialize_habit_rows(habits.values(*HABIT_VALUES))),
+            renderer.render(HabitSerializer(habits, many=True).data),
+        )
+
+    def test_habit_list_cursor_pagination(self):
+        for i in range(5):
+            Habit.objects.create(
+                user=self.user,
+                place=f"Place {i}",
+                action=f"Action {i}",
+                is_pleasant=True,
+                time_needed=30,
+                is_public=False,
+            )
+        url = reverse("habits:habit-list")
+        request = self.client.get(url, {"pagination": "cursor"})
+        response = request.json()
+
+        self.assertEqual(request.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response)
+        self.assertEqual([habit["id"] for habit in response["results"]], [1, 2, 5, 6, 7])
+
+        request = self.client.get(response["next"])
+        response = request.json()
+
+        self.assertEqual([habit["place"] for habit in response["results"]], ["Place 3", "Place 4"])
+        self.assertIsNone(response["next"])
+
+    @mock.patch("habits.paginators.HABIT_PAGINATION", "cursor")
+    def test_public_habit_list_cursor_pagination(self):
+        url = reverse("habits:public-habit-list")
+        request = self.client.get(url)
+        response = request.json()
+
+        self.assertEqual(request.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response["results"]), 2)
+        self.assertIsNone(response["next"])
+
     def test_public_habit_list(self):
         url = reverse("habits:public-habit-list")
         request = self.client.get(url)
@@ -571,20 +803,62 @@ class HabitTestCase(APITestCase):
         self.assertEqual(request.status_code, status.HTTP_200_OK)
         self.assertEqual(
             response,
-            [
-                {
-                    "action": self.good_habit.action,
-                    "is_pleasant": self.good_habit.is_pleasant,
-                    "time_needed": self.good_habit.time_needed,
-                },
-                {
-                    "action": self.pleasant_habit2.action,
-                    "is_pleasant": self.pleasant_habit2.is_pleasant,
-                    "time_needed": self.pleasant_habit2.time_needed,
-                },
-            ],
+            {
+                "count": 2,
+                "next": None,
+                "previous": None,
+                "results": [
+                    {
+                        "action": self.good_habit.action,
+                        "is_pleasant": self.good_habit.is_pleasant,
+                        "time_needed": self.good_habit.time_needed,
+                    },
+                    {
+                        "action": self.pleasant_habit2.action,
+                        "is_pleasant": self.pleasant_habit2.is_pleasant,
+                        "time_needed": self.pleasant_habit2.time_needed,
+                    },
+                ],
+            },
         )
 
+    @mock.patch("habits.views.PUBLIC_HABITS_CACHE_ENABLED", True)
+    def test_public_habit_list_cache(self):
+        url = reverse("habits:public-habit-list")
+        request = self.client.get(url)
+        etag = request["ETag"]
+
+        with self.assertNumQueries(0):
+            request = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(request.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.pleasant_habit3.is_public = True
+        self.pleasant_habit3.save()
+        request = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(request.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(request["ETag"], etag)
+        self.assertEqual(request.json()["count"], 3)
+
+    def test_public_habit_list_without_shared_cache(self):
+        url = reverse("habits:public-habit-list")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(2):
+            request = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(request.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @mock.patch("habits.views.PUBLIC_HABITS_CACHE_ENABLED", True)
+    @override_settings(ALLOWED_HOSTS=["one.example.com", "two.example.com"])
+    def test_public_habit_list_cache_per_host(self):
+        url = reverse("habits:public-habit-list")
+        for host in ("one.example.com", "two.example.com"):
+            request = self.client.get(url, {"page_size": 1}, HTTP_HOST=host)
+
+            self.assertTrue(request.json()["next"].startswith(f"http://{host}/"))
+        request = self.client.get(url, {"page_size": 1}, HTTP_HOST="two.example.com", secure=True)
+        self.assertTrue(request.json()["next"].startswith("https://two.example.com/"))
+
     def test_habit_update(self):
         url = reverse("habits:habit-update", args=(self.good_habit.pk,))
         body = {
@@ -609,3 +883,713 @@ class HabitTestCase(APITestCase):
 
         self.assertEqual(request.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Habit.objects.all().count(), 3)
+
+
+class QueryCountTestCase(APITestCase):
+    """Keeps the number of queries of every endpoint fixed, including lookups done by validation."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="user@user.ru", tg_chat_id="12345")
+        self.pleasant_habit = Habit.objects.create(
+            user=self.user, place="Place 1", action="Action 1", is_pleasant=True, time_needed=30, is_public=True
+        )
+        self.good_habit = Habit.objects.create(
+            user=self.user,
+            place="Place 2",
+            time="2025-03-30T15:30:00+03:00",
+            action="Action 2",
+            is_pleasant=False,
+            frequency="30 15 * * *",
+            related_habit=self.pleasant_habit,
+            time_needed=90,
+            is_public=True,
+        )
+        self.body = {
+            "place": "Place 3",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 3",
+            "is_pleasant": False,
+            "frequency": "m h * * *",
+            "related_habit_id": self.pleasant_habit.pk,
+            "time_needed": 90,
+            "is_public": False,
+        }
+        self.client.force_authenticate(user=self.user)
+
+    def assertQueries(self, number, method, url, data=None):
+        with self.assertNumQueries(number):
+            response = getattr(self.client, method)(url, data, format="json")
+        self.assertLess(response.status_code, 300)
+
+    def test_habit_create(self):
+        # related habit, savepoint, insert, outbox insert, release
+        self.assertQueries(5, "post", reverse("habits:habit-create"), self.body)
+
+    def test_habit_update(self):
+        # habit with related habit, savepoint, update, outbox insert, release
+        url = reverse("habits:habit-update", args=(self.good_habit.pk,))
+        self.assertQueries(5, "patch", url, {"place": "Place new", "frequency": "m h * * *"})
+
+    def test_habit_bulk(self):
+        # related habit, savepoint, insert, outbox insert, release
+        self.assertQueries(5, "post", reverse("habits:habit-bulk"), [self.body] * 10)
+
+    def test_habit_retrieve(self):
+        self.assertQueries(1, "get", reverse("habits:habit-detail", args=(self.good_habit.pk,)))
+
+    def test_habit_list(self):
+        self.assertQueries(2, "get", reverse("habits:habit-list"))
+
+    @mock.patch("habits.views.PUBLIC_HABITS_CACHE_ENABLED", True)
+    def test_public_habit_list(self):
+        # cache version and page are kept in the cache
+        self.assertQueries(2, "get", reverse("habits:public-habit-list"))
+        self.assertQueries(0, "get", reverse("habits:public-habit-list"))
+
+    def test_habit_delete(self):
+        # habit, related habits set to null, delete
+        self.assertQueries(3, "delete", reverse("habits:habit-delete", args=(self.good_habit.pk,)))
+
+
+class RendererTestCase(TestCase):
+
+    def setUp(self):
+        self.data = {
+            "text": "Привет\u2028мир\u2029",
+            "time": datetime(2025, 4, 1, 15, 30, tzinfo=ZoneInfo("UTC")),
+            "date": datetime(2025, 4, 1).date(),
+            "decimal": Decimal("1.50"),
+            "numbers": [1, 2.5, None, True],
+            1: "non-string key",
+        }
+
+    def test_fast_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_fast_json_renderer_indent(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, "application/json; indent=4"),
+            JSONRenderer().render(self.data, "application/json; indent=4"),
+        )
+
+    def test_fast_json_parser(self):
+        content = FastJSONRenderer().render(self.data)
+
+        self.assertEqual(FastJSONParser().parse(BytesIO(content)), JSONParser().parse(BytesIO(content)))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b"{"))
+
+    @skipIf(msgpack is None, "msgpack is not installed")
+    def test_message_pack(self):
+        data = {key: value for key, value in self.data.items() if isinstance(key, str)}
+        content = MessagePackRenderer().render(data)
+
+        self.assertEqual(
+            MessagePackParser().parse(BytesIO(content)), JSONParser().parse(BytesIO(JSONRenderer().render(data)))
+        )
+        self.assertEqual(MessagePackParser().parse(BytesIO(MessagePackRenderer().render({1: "a"}))), {1: "a"})
+
+
+class RequestTimingTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="user@user.ru")
+        self.client.force_authenticate(self.user)
+        self.data = {
+            "place": "Place 1",
+            "time": "2025-03-30T16:30:00+03:00",
+            "action": "Action 1",
+            "is_pleasant": False,
+            "frequency": "m h * * *",
+            "reward": "Reward 1",
+            "time_needed": 60,
+            "is_public": False,
+        }
+
+    @mock.patch("config.instrumentation.REQUEST_TIMING_SAMPLE_RATE", 1.0)
+    def test_server_timing(self):
+        with self.assertLogs("config.instrumentation", "INFO") as logs:
+            response = self.client.post(reverse("habits:habit-create"), self.data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        metrics = [metric.split(";")[0] for metric in response["Server-Timing"].split(", ")]
+        self.assertEqual(metrics, ["db", "validate", "schedule", "save", "render", "total"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "habits:habit-create")
+        self.assertEqual(record["status"], 201)
+        self.assertGreater(record["queries"], 0)
+        self.assertEqual(set(record["phases_ms"]), {"validate", "schedule", "save", "render"})
+
+    @mock.patch("config.instrumentation.REQUEST_TIMING_SAMPLE_RATE", 0.0)
+    def test_not_sampled(self):
+        response = self.client.get(reverse("habits:habit-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_phase(self):
+        with phase("outside"):
+            pass
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            for _ in range(2):
+                with phase("validate"):
+                    pass
+        finally:
+            current_timings.reset(token)
+
+        self.assertEqual(list(timings.phases), ["validate"])
+
+
+class ReminderDispatcherTestCase(TestCase):
+
+    def setUp(self):
+        self.moment = datetime(2025, 4, 1, 15, 30, tzinfo=ZoneInfo("Europe/Moscow"))
+        self.user = User.objects.create(email="user@user.ru", tg_chat_id="12345")
+        self.daily_habit = Habit.objects.create(
+            user=self.user,
+            place="Place 1",
+            time="2025-03-30T15:30:00+03:00",
+            action="Action 1",
+            is_pleasant=False,
+            frequency="30 15 * * *",
+            reward="Reward 1",
+            time_needed=90,
+            is_public=False,
+            next_fire_at=self.moment,
+        )
+        self.monday_habit = Habit.objects.create(
+            user=self.user,
+            place="Place 2",
+            time="2025-03-30T15:30:00+03:00",
+            action="Action 2",
+            is_pleasant=False,
+            frequency="30 15 * * mon",
+            reward="Reward 2",
+            days_of_week=0b1,
+            time_needed=90,
+            is_public=False,
+            next_fire_at=datetime(2025, 4, 7, 15, 30, tzinfo=ZoneInfo("Europe/Moscow")),
+        )
+
+    def test_get_next_fire_at(self):
+        self.assertEqual(get_next_fire_at("30 15 * * mon", self.moment), self.monday_habit.next_fire_at)
+        self.assertEqual(get_next_fire_at("30 15 * * *", self.moment.replace(minute=29)), self.moment)
+
+    def test_get_due_habits(self):
+        self.assertEqual(get_due_habits(self.moment), [self.daily_habit.pk])
+        self.assertEqual(get_due_habits(self.moment), [])
+
+        self.daily_habit.refresh_from_db()
+        self.assertEqual(self.daily_habit.next_fire_at, datetime(2025, 4, 2, 15, 30, tzinfo=ZoneInfo("Europe/Moscow")))
+
+    def test_get_due_habits_on_selected_days_only(self):
+        self.monday_habit.next_fire_at = self.moment
+        self.monday_habit.save()
+
+        self.assertEqual(get_due_habits(self.moment), [self.daily_habit.pk])
+        self.monday_habit.refresh_from_db()
+        self.assertEqual(
+            self.monday_habit.next_fire_at, datetime(2025, 4, 7, 15, 30, tzinfo=ZoneInfo("Europe/Moscow"))
+        )
+
+    def test_get_due_habits_without_chat_id(self):
+        self.user.tg_chat_id = None
+        self.user.save()
+
+        self.assertEqual(get_due_habits(self.moment), [])
+
+    @mock.patch("habits.tasks.HABIT_REMINDER_MODE", "dispatcher")
+    @mock.patch("habits.tasks.timezone.now")
+    @mock.patch("habits.tasks.send_messages_batch.apply_async")
+    def test_dispatch_reminders(self, apply_async, now):
+        now.return_value = self.moment
+        dispatch_reminders()
+
+        apply_async.assert_called_once_with(([self.daily_habit.pk],), countdown=0)
+
+    @mock.patch("habits.tasks.HABIT_REMINDER_MODE", "dispatcher")
+    @mock.patch("habits.tasks.HABIT_REMINDER_SMOOTHING", True)
+    @mock.patch("habits.tasks.HABIT_REMINDER_BATCH_SIZE", 1)
+    @mock.patch("habits.tasks.timezone.now")
+    @mock.patch("habits.tasks.send_messages_batch.apply_async")
+    def test_dispatch_reminders_smoothing(self, apply_async, now):
+        now.return_value = self.moment
+        for _ in range(3):
+            self.daily_habit.pk = None
+            self.daily_habit.save()
+        dispatch_reminders()
+
+        countdowns = [call.kwargs["countdown"] for call in apply_async.call_args_list]
+        self.assertEqual(countdowns, [0, 30, 60, 90])
+
+    def test_get_upcoming_volumes(self):
+        Habit.objects.filter(pk=self.daily_habit.pk).update(next_fire_at=self.moment + timedelta(seconds=90))
+
+        self.assertEqual(get_upcoming_volumes(self.moment, 2), [1, 0])
+
+    def test_get_send_delays(self):
+        self.assertEqual(get_send_delays(0, [10, 10], 120), [])
+        # A quiet next minute lets the current one spread over the whole window.
+        self.assertEqual(get_send_delays(4, [0, 0], 120), [0, 30, 60, 90])
+        # A busy next minute keeps the current one within its own minute.
+        delays = get_send_delays(4, [1000, 1000], 120)
+        self.assertLess(delays[-1], 1)
+        self.assertEqual(delays, sorted(delays))
+
+    @mock.patch("habits.delivery.send_telegram_message")
+    def test_send_messages_batch(self, send_telegram_message):
+        send_telegram_message.return_value.ok = True
+        with self.assertNumQueries(1):
+            outcomes = send_messages_batch([self.daily_habit.pk, 100])
+
+        self.assertEqual(
+            outcomes, [{"habit": 100, "status": "not found"}, {"habit": self.daily_habit.pk, "status": "sent"}]
+        )
+        send_telegram_message.assert_called_once_with(
+            "12345", "It's time to do Action 1 at Place 1! Don't forget to Reward 1 afterwards."
+        )
+
+    @mock.patch("habits.delivery.get_rate_limiter", lambda: MemoryRateLimiter(global_rate=1000, chat_rate=1000))
+    @mock.patch("habits.delivery.send_telegram_message")
+    def test_deliver_reminders_keeps_chat_order(self, send_telegram_message):
+        send_telegram_message.return_value.ok = True
+        reminders = [Reminder(pk, str(pk % 2), f"Reminder {pk}") for pk in range(10)]
+        outcomes = deliver_reminders(reminders, max_in_flight=4)
+
+        self.assertEqual(len(outcomes), 10)
+        for chat_id in ("0", "1"):
+            texts = [call.args[1] for call in send_telegram_message.call_args_list if call.args[0] == chat_id]
+            self.assertEqual(texts, [reminder.text for reminder in reminders if reminder.chat_id == chat_id])
+
+    @mock.patch("habits.delivery.get_rate_limiter")
+    @mock.patch("habits.delivery.send_telegram_message")
+    def test_send_reminder_throttled_without_json(self, send_telegram_message, get_rate_limiter):
+        response = requests.Response()
+        response.status_code = 429
+        response._content = b"Too Many Requests"
+        response.headers["Retry-After"] = "3"
+        send_telegram_message.return_value = response
+        outcome = send_reminder(Reminder(1, "12345", "Reminder"))
+
+        self.assertEqual(outcome, {"habit": 1, "status": "throttled", "detail": "retry after 3 s"})
+        get_rate_limiter.return_value.block.assert_called_once_with(3)
+
+        del response.headers["Retry-After"]
+        self.assertEqual(send_reminder(Reminder(1, "12345", "Reminder"))["detail"], "retry after 1 s")
+
+    @mock.patch("habits.telegram.TELEGRAM_BOT_TOKEN", "SECRET123")
+    @mock.patch("habits.telegram.TELEGRAM_API_URL", "http://127.0.0.1:1")
+    def test_send_reminder_error_hides_token(self):
+        outcome = send_reminder(Reminder(1, "12345", "Reminder"))
+
+        self.assertEqual(outcome, {"habit": 1, "status": "error", "detail": "ConnectionError"})
+
+
+class RateLimiterTestCase(TestCase):
+
+    def test_reserve_global_rate(self):
+        rate_limiter = MemoryRateLimiter(global_rate=10, chat_rate=10)
+        waits = [rate_limiter.reserve(str(chat_id)) for chat_id in range(11)]
+
+        self.assertEqual(waits[:10], [0] * 10)
+        self.assertAlmostEqual(waits[10], 0.1, places=2)
+
+    def test_reserve_chat_rate(self):
+        rate_limiter = MemoryRateLimiter(global_rate=30, chat_rate=1)
+
+        self.assertEqual(rate_limiter.reserve("1"), 0)
+        self.assertAlmostEqual(rate_limiter.reserve("1"), 1, places=2)
+        self.assertEqual(rate_limiter.reserve("2"), 0)
+        self.assertEqual(rate_limiter.metrics()["delayed"], 1)
+
+    def test_block(self):
+        rate_limiter = MemoryRateLimiter(global_rate=30, chat_rate=1)
+        rate_limiter.block(5)
+
+        self.assertAlmostEqual(rate_limiter.reserve("1"), 5, places=2)
+        self.assertEqual(rate_limiter.metrics()["throttled"], 1)
+
+
+@mock.patch("habits.services.SCHEDULE_CACHE_ENABLED", True)
+class ScheduleCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        schedule_cache.clear()
+
+    def test_create_schedule_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule = create_schedule("30 15 * * mon")
+        with self.assertNumQueries(0):
+            cached_schedule = create_schedule("30 15 * * mon")
+
+        self.assertEqual(cached_schedule.pk, schedule.pk)
+        self.assertEqual(schedule_cache.info(), {"hits": 1, "misses": 1, "maxsize": 1024, "currsize": 1})
+
+    def test_create_schedule_evicted_on_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule = create_schedule("30 15 * * mon")
+        schedule.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            new_schedule = create_schedule("30 15 * * mon")
+
+        self.assertNotEqual(new_schedule.pk, schedule.pk)
+        self.assertEqual(schedule_cache.info()["misses"], 2)
+
+    def test_create_schedule_evicted_by_other_process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_schedule("30 15 * * mon")
+        # Another process deleted a schedule and changed the shared version.
+        cache.set(SCHEDULE_CACHE_VERSION_KEY, 0, timeout=None)
+        with self.assertNumQueries(1):
+            create_schedule("30 15 * * mon")
+
+        self.assertEqual(schedule_cache.info()["misses"], 2)
+
+    def test_create_schedule_without_shared_cache(self):
+        with mock.patch("habits.services.SCHEDULE_CACHE_ENABLED", False):
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule = create_schedule("30 15 * * mon")
+            with self.assertNumQueries(1):
+                self.assertEqual(create_schedule("30 15 * * mon").pk, schedule.pk)
+
+        self.assertEqual(schedule_cache.info()["currsize"], 0)
+
+    def test_sync_reminder_tasks_checks_version_once(self):
+        user = User.objects.create(email="user@user.ru", tg_chat_id="12345")
+        habits = Habit.objects.bulk_create(
+            Habit(
+                user=user,
+                place=f"Place {i}",
+                action=f"Action {i}",
+                is_pleasant=False,
+                frequency=f"{i} 15 * * *",
+                reward="Reward",
+                time_needed=60,
+                is_public=False,
+            )
+            for i in range(3)
+        )
+        with mock.patch.object(schedule_cache, "check_version") as check_version:
+            self.assertEqual(sync_reminder_tasks(habits), 3)
+
+        check_version.assert_called_once_with()
+
+
+class PeriodicTaskTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="user@user.ru", tg_chat_id="12345")
+        self.habit = Habit.objects.create(
+            user=self.user,
+            place="Place 1",
+            time="2025-03-30T15:30:00+03:00",
+            action="Action 1",
+            is_pleasant=False,
+            frequency="30 15 * * *",
+            reward="Reward 1",
+            time_needed=90,
+            is_public=False,
+        )
+        create_task(create_schedule(self.habit.frequency), self.habit)
+        self.task = PeriodicTask.objects.get(name=f"Sending reminder {self.habit.pk}")
+
+    def test_sync_reminder_tasks_unchanged(self):
+        last_update = PeriodicTasks.last_change()
+
+        self.assertEqual(sync_reminder_tasks([self.habit]), 0)
+        self.assertEqual(PeriodicTasks.last_change(), last_update)
+        self.assertEqual(PeriodicTask.objects.get(pk=self.task.pk).date_changed, self.task.date_changed)
+
+    def test_sync_reminder_tasks_in_place(self):
+        self.habit.frequency = "0 9 * * *"
+        self.assertEqual(sync_reminder_tasks([self.habit]), 1)
+        schedule = create_schedule("0 9 * * *")
+
+        task = PeriodicTask.objects.get(name=f"Sending reminder {self.habit.pk}")
+        self.assertEqual(task.pk, self.task.pk)
+        self.assertEqual(task.crontab_id, schedule.pk)
+        self.assertGreater(task.date_changed, self.task.date_changed)
+
+    def test_sync_reminder_tasks_missing(self):
+        self.task.delete()
+        self.assertEqual(sync_reminder_tasks([self.habit]), 1)
+
+        self.assertTrue(PeriodicTask.objects.filter(name=f"Sending reminder {self.habit.pk}").exists())
+
+    def test_drain_outbox(self):
+        self.task.delete()
+        record_schedule_change(self.habit)
+        record_schedule_change(self.habit)
+        Habit.objects.filter(pk=self.habit.pk).update(frequency="0 9 * * *")
+
+        self.assertEqual(drain_outbox(100), 2)
+        self.assertEqual(drain_outbox(100), 0)
+        task = PeriodicTask.objects.select_related("crontab").get(name=f"Sending reminder {self.habit.pk}")
+        self.assertEqual((task.crontab.minute, task.crontab.hour), ("0", "9"))
+
+    def test_delete_habits_deletes_tasks(self):
+        other_habit = Habit.objects.create(
+            user=self.user, place="Place 2", action="Action 2", is_pleasant=True, time_needed=60, is_public=False
+        )
+        create_task(create_schedule("0 9 * * *"), other_habit)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertFalse(PeriodicTask.objects.filter(task="habits.tasks.send_message").exists())
+
+    def test_delete_habits_rolled_back_savepoint(self):
+        other_habit = Habit.objects.create(
+            user=self.user, place="Place 2", action="Action 2", is_pleasant=True, time_needed=60, is_public=False
+        )
+        create_task(create_schedule("0 9 * * *"), other_habit)
+        with self.captureOnCommitCallbacks(execute=True):
+            Habit.objects.filter(pk=self.habit.pk).delete()
+            try:
+                with transaction.atomic():
+                    Habit.objects.filter(pk=other_habit.pk).delete()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+
+        self.assertTrue(Habit.objects.filter(pk=other_habit.pk).exists())
+        self.assertEqual(
+            list(PeriodicTask.objects.values_list("name", flat=True)), [f"Sending reminder {other_habit.pk}"]
+        )
+
+    def test_delete_reminder_tasks_queries(self):
+        habits = Habit.objects.bulk_create(
+            Habit(user=self.user, place="Place", action="Action", is_pleasant=True, time_needed=60, is_public=False)
+            for _ in range(50)
+        )
+        schedule = create_schedule("0 9 * * *")
+        for habit in habits:
+            create_task(schedule, habit)
+        last_update = PeriodicTasks.last_change()
+
+        # One delete and an update of the PeriodicTasks row in a savepoint, however many tasks are deleted.
+        with self.assertNumQueries(5):
+            self.assertEqual(delete_reminder_tasks([habit.pk for habit in habits]), 50)
+        self.assertGreater(PeriodicTasks.last_change(), last_update)
+        self.assertEqual(list(PeriodicTask.objects.all()), [self.task])
+
+    def test_delete_orphan_reminder_tasks(self):
+        Habit.objects.filter(pk=self.habit.pk).delete()
+        other_habit = Habit.objects.create(
+            user=self.user, place="Place 2", action="Action 2", is_pleasant=True, time_needed=60, is_public=False
+        )
+        create_task(create_schedule("0 9 * * *"), other_habit)
+        call_command("delete_orphan_reminder_tasks", chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(PeriodicTask.objects.values_list("name", flat=True)), [f"Sending reminder {other_habit.pk}"]
+        )
+
+    def test_delete_orphan_reminder_tasks_malformed_args(self):
+        Habit.objects.filter(pk=self.habit.pk).delete()
+        schedule = create_schedule("0 9 * * *")
+        malformed = [
+            PeriodicTask.objects.create(crontab=schedule, name=f"Broken reminder {i}", task=self.task.task, args=args)
+            for i, args in enumerate(("[]", "{}", "not json", '["1"]'))
+        ]
+        out = StringIO()
+        call_command("delete_orphan_reminder_tasks", stdout=out)
+
+        self.assertEqual(list(PeriodicTask.objects.order_by("pk")), malformed)
+        self.assertIn("checked: 5\nmalformed: 4\n", out.getvalue())
+        self.assertIn(f"{[task.pk for task in malformed]}", out.getvalue())
+
+    @mock.patch("habits.tasks.deliver_reminder")
+    def test_send_message_advances_next_fire_at(self, deliver_reminder):
+        Habit.objects.filter(pk=self.habit.pk).update(next_fire_at=timezone.now() - timedelta(days=1))
+        send_message(self.habit.pk)
+
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.next_fire_at, get_next_fire_at(self.habit.frequency))
+        deliver_reminder.assert_called_once()
+        self.assertEqual(reconcile_habits([self.habit])["habits repaired"], 0)
+
+    @mock.patch("habits.tasks.HABIT_REMINDER_MODE", "dispatcher")
+    @mock.patch("habits.tasks.deliver_reminder")
+    def test_send_message_dispatcher_mode(self, deliver_reminder):
+        send_message(self.habit.pk)
+
+        deliver_reminder.assert_not_called()
+
+    def test_disable_reminder_tasks(self):
+        with self.assertRaises(CommandError):
+            call_command("disable_reminder_tasks", stdout=StringIO())
+        with mock.patch("habits.management.commands.disable_reminder_tasks.HABIT_REMINDER_MODE", "dispatcher"):
+            call_command("disable_reminder_tasks", stdout=StringIO())
+
+        self.assertFalse(PeriodicTask.objects.get(pk=self.task.pk).enabled)
+        reconcile_habits(list(Habit.objects.select_related("user").filter(pk=self.habit.pk)))
+        self.assertTrue(PeriodicTask.objects.get(pk=self.task.pk).enabled)
+
+    def test_send_message_deleted_habit(self):
+        Habit.objects.filter(pk=self.habit.pk).delete()
+        send_message(self.habit.pk)
+
+        self.assertFalse(PeriodicTask.objects.filter(pk=self.task.pk).exists())
+
+    def test_reconcile_reminders(self):
+        Habit.objects.filter(pk=self.habit.pk).update(frequency="m h * * *", next_fire_at=None)
+        self.task.delete()
+        broken_habit = Habit.objects.create(
+            user=self.user,
+            place="Place 2",
+            action="Action 2",
+            is_pleasant=False,
+            frequency="m h * * *",
+            reward="Reward 2",
+            time_needed=60,
+            is_public=False,
+        )
+        out = StringIO()
+        call_command("reconcile_reminders", chunk_size=1, stdout=out)
+
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.frequency, "30 15 * * *")
+        self.assertEqual(self.habit.next_fire_at, get_next_fire_at("30 15 * * *"))
+        self.assertTrue(PeriodicTask.objects.filter(name=f"Sending reminder {self.habit.pk}").exists())
+        self.assertFalse(PeriodicTask.objects.filter(name=f"Sending reminder {broken_habit.pk}").exists())
+        self.assertIn("invalid: 1\nfrequencies repaired: 1\nhabits repaired: 1\ntasks repaired: 1", out.getvalue())
+
+    def test_reconcile_habits_consistent(self):
+        Habit.objects.filter(pk=self.habit.pk).update(next_fire_at=get_next_fire_at("30 15 * * *"))
+        habits = list(Habit.objects.select_related("user"))
+
+        self.assertEqual(reconcile_habits(habits), {"checked": 1, "habits repaired": 0, "tasks repaired": 0})
+
+    def test_reconcile_habits_without_frequency(self):
+        Habit.objects.filter(pk=self.habit.pk).update(frequency=None)
+        out = StringIO()
+        call_command("reconcile_reminders", stdout=out)
+
+        self.assertIn("checked: 1\ninvalid: 1\n", out.getvalue())
+        self.assertTrue(PeriodicTask.objects.filter(name=f"Sending reminder {self.habit.pk}").exists())
+
+    def test_incremental_scheduler(self):
+        # Beat only loads crontab tasks with hours close to the current one.
+        self.habit.frequency = "30 * * * *"
+        sync_reminder_tasks([self.habit])
+        scheduler = IncrementalDatabaseScheduler(app=app, lazy=True)
+        self.assertIn(self.task.name, scheduler.schedule)
+
+        other_habit = Habit.objects.create(
+            user=self.user, place="Place 2", action="Action 2", is_pleasant=True, time_needed=60, is_public=False
+        )
+        create_task(create_schedule("0 * * * *"), other_habit)
+        self.task.delete()
+        with mock.patch.object(scheduler, "all_as_schedule") as all_as_schedule:
+            schedule = scheduler.schedule
+
+        all_as_schedule.assert_not_called()
+        self.assertNotIn(self.task.name, schedule)
+        self.assertIn(f"Sending reminder {other_habit.pk}", schedule)
+
+
+class ScheduleTestCase(TestCase):
+
+    def test_make_replacements(self):
+        habit = Habit(time="2025-03-30T09:30:00+03:00", end_time="2025-03-30T18:30:00+03:00", days_of_week=0b101)
+        replacements = create_replacements(habit)
+
+        self.assertEqual(make_replacements("m x-y/2 * * *", replacements), "30 9-18/2 * * *")
+        self.assertEqual(make_replacements("m x,z,y * * *", replacements), "30 9,13,18 * * *")
+        self.assertEqual(make_replacements("m h * * d", replacements), "30 9 * * mon,wed")
+        self.assertEqual(make_replacements("30 9 * * mon,wed", replacements), "30 9 * * mon,wed")
+
+    def test_next_fire_times(self):
+        moscow = ZoneInfo("Europe/Moscow")
+        fire_times = compile_crontab("30 9-18/3 */2 * *").next_fire_times(
+            datetime(2025, 4, 1, 16, 0, tzinfo=moscow), 4
+        )
+
+        self.assertEqual(
+            fire_times,
+            [
+                datetime(2025, 4, 1, 18, 30, tzinfo=moscow),
+                datetime(2025, 4, 3, 9, 30, tzinfo=moscow),
+                datetime(2025, 4, 3, 12, 30, tzinfo=moscow),
+                datetime(2025, 4, 3, 15, 30, tzinfo=moscow),
+            ],
+        )
+        self.assertTrue(compile_crontab("30 9 * * sun").is_due(datetime(2025, 3, 30, 9, 30, tzinfo=moscow)))
+
+
+@skipIf(np is None, "NumPy is not installed")
+class ReminderForecastTestCase(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(email="admin@user.ru", is_staff=True)
+        self.user = User.objects.create(email="user@user.ru", tg_chat_id="12345")
+        Habit.objects.create(
+            user=self.user,
+            place="Place 1",
+            time="2025-03-30T15:30:00+03:00",
+            action="Action 1",
+            is_pleasant=False,
+            frequency="30 15 * * *",
+            reward="Reward 1",
+            time_needed=90,
+            is_public=False,
+        )
+
+    def test_expand_schedules(self):
+        start = datetime(2025, 3, 31, 0, 0, tzinfo=ZoneInfo("Europe/Moscow"))
+        volumes = expand_schedules(["30 9 * * *", "0 10-12 * * mon"], [3, 2], start, 2 * 24 * 60)
+
+        self.assertEqual(volumes.sum(), 12)
+        self.assertEqual(volumes[570], 3)
+        self.assertEqual(volumes[1440 + 570], 3)
+        self.assertEqual([volumes[600], volumes[660], volumes[720], volumes[1440 + 600]], [2, 2, 2, 0])
+
+    def test_reminder_forecast(self):
+        url = reverse("habits:reminder-forecast")
+        self.client.force_authenticate(user=self.user)
+        request = self.client.get(url)
+
+        self.assertEqual(request.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        request = self.client.get(url, {"days": 2})
+        response = request.json()
+
+        self.assertEqual(request.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response["reminders"]), 2 * 24 * 60)
+        self.assertEqual(response["total"], 2)
+
+    def test_load_schedules_without_frequency(self):
+        habit = Habit.objects.create(
+            user=self.user, place="Place 2", action="Action 2", is_pleasant=False, time_needed=60, is_public=False
+        )
+        Habit.objects.filter(pk=habit.pk).update(frequency=None)
+
+        self.assertEqual(load_schedules(), (["30 15 * * *"], [1]))
+
+
+class BenchmarkTestCase(TestCase):
+
+    def test_explain_habit_queries(self):
+        out = StringIO()
+        call_command("explain_habit_queries", users=1, habits=0, stdout=out)
+
+        self.assertIn("habit list, cursor page", out.getvalue())
+        self.assertFalse(User.objects.exists())
+        with self.assertRaises(CommandError):
+            call_command("explain_habit_queries", users=0, stdout=StringIO())
+
+    def test_run_benchmarks(self):
+        out = StringIO()
+        call_command("run_benchmarks", users=2, habits=2, repeat=1, bulk_size=2, batch_size=2, stdout=out)
+
+        report, _ = json.JSONDecoder().raw_decode(out.getvalue())
+        benchmarks = [result["benchmark"] for result in report["results"]]
+        self.assertIn("view: habit bulk (2)", benchmarks)
+        self.assertIn("send_messages_batch (2)", benchmarks)
+        self.assertFalse(User.objects.exists())
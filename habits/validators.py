@@ -2,19 +2,41 @@ from datetime import datetime
 
 from rest_framework import serializers
 
+from config.instrumentation import phase
 from habits.models import Habit
 
 
 class HabitValidator:
+    def validate_required_fields(self, attrs):
+        """Validates that fields required by the model are present."""
+        missing = [
+            field
+            for field in ("place", "action", "is_pleasant", "time_needed", "is_public")
+            if attrs.get(field) is None
+        ]
+        if missing:
+            raise serializers.ValidationError({field: ["This field is required."] for field in missing})
+
     def validate_time_needed(self, attrs):
         """Validates that time needed to perform a habit is less than 2 mins (120 secs)."""
         if attrs["time_needed"] > 120:
             raise serializers.ValidationError("The time should be less then 2 mins (120 secs).")
 
-    def validate_related_habit(self, attrs):
-        """Validates that only a pleasant habit can be selected as related."""
-        if attrs.get("related_habit_id"):
-            related_habit = Habit.objects.get(pk=attrs.get("related_habit_id"))
+    def validate_related_habit(self, attrs, related_habits=None, instance=None):
+        """Validates that only a pleasant habit can be selected as related. Related habits prefetched by pk can be
+        passed in the serializer context to avoid a query per habit, the current related habit of an updated habit
+        is taken from the habit."""
+        pk = attrs.get("related_habit_id")
+        if pk:
+            pk = int(pk) if str(pk).isdigit() else None
+            if instance is not None and instance.related_habit_id == pk:
+                related_habit = instance.related_habit
+            elif related_habits is None:
+                related_habit = Habit.objects.filter(pk=pk).first()
+            else:
+                related_habit = related_habits.get(pk)
+            if related_habit is None:
+                raise serializers.ValidationError("Related habit doesn't exist.")
             if not related_habit.is_pleasant:
                 raise serializers.ValidationError("Only a pleasant habit can be selected as related.")
 
@@ -78,9 +100,13 @@ class HabitValidator:
                 "Specific days should be selected only for habits performed on selected days."
             )
 
-    def __call__(self, attrs):
+    requires_context = True
+
+    @phase("validate")
+    def __call__(self, attrs, serializer):
+        self.validate_required_fields(attrs)
         self.validate_time_needed(attrs)
-        self.validate_related_habit(attrs)
+        self.validate_related_habit(attrs, serializer.context.get("related_habits"), serializer.instance)
         self.validate_reward(attrs)
         self.validate_pleasant_habit(attrs)
         self.validate_end_time(attrs)
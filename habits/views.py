@@ -1,42 +1,196 @@
-from django.shortcuts import get_object_or_404
-from django_celery_beat.models import PeriodicTask
-from rest_framework import generics
-
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import generics, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from config.instrumentation import phase
+from config.settings import (HABIT_BULK_MAX_SIZE, HABIT_REMINDER_MODE, PUBLIC_HABITS_CACHE_ENABLED,
+                             PUBLIC_HABITS_CACHE_TIMEOUT)
+from habits.forecast import forecast_reminders, summarize_forecast
 from habits.models import Habit
-from habits.paginators import HabitPagination
-from habits.serializers import HabitSerializer, PublicHabitSerializer
-from habits.services import create_replacements, create_schedule, create_task, make_replacements
+from habits.paginators import HabitPagination, select_pagination_class
+from habits.serializers import HABIT_VALUES, HabitSerializer, PublicHabitSerializer, serialize_habit_rows
+from habits.services import bulk_save_habits, get_public_habits_cache_key, record_schedule_change, render_schedule
+from habits.tasks import drain_schedule_outbox
 from users.permissions import IsUser
 
 
-class HabitCreateAPIView(generics.CreateAPIView):
+class RelatedHabitsMixin:
+    """Prefetches related habits of all habits in the request with a single query and passes them to HabitValidator
+    in the serializer context."""
+
+    def get_related_habits(self) -> dict[int, Habit]:
+        items = self.request.data if isinstance(self.request.data, list) else [self.request.data]
+        pks = {str(item.get("related_habit_id")) for item in items if isinstance(item, dict)}
+        pks = {int(pk) for pk in pks if pk.isdigit()}
+        return Habit.objects.in_bulk(pks) if pks else {}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in ("POST", "PUT", "PATCH"):
+            context["related_habits"] = self.get_related_habits()
+        return context
+
+
+def save_habit(serializer, user) -> None:
+    """Saves a habit with its rendered frequency in a single query. Reminder tasks are synced by a Celery task
+    after the commit, see drain_schedule_outbox."""
+    schedule = {} if serializer.validated_data.get("is_pleasant") else render_schedule(serializer.validated_data)
+    with phase("save"), transaction.atomic():
+        habit = serializer.save(user=user, **schedule)
+        if schedule and user.tg_chat_id and HABIT_REMINDER_MODE == "periodic_task":
+            record_schedule_change(habit)
+            transaction.on_commit(drain_schedule_outbox.delay, robust=True)
+
+
+class HabitCreateAPIView(RelatedHabitsMixin, generics.CreateAPIView):
     serializer_class = HabitSerializer
 
     def perform_create(self, serializer):
-        habit = serializer.save(user=self.request.user)
-        if not habit.is_pleasant:
-            replacements = create_replacements(habit)
-            habit.frequency = make_replacements(habit.frequency, replacements)
-            habit.save()
+        save_habit(serializer, self.request.user)
 
-            if habit.user.tg_chat_id:
-                schedule = create_schedule(habit.frequency)
-                create_task(schedule, habit)
 
+class HabitBulkAPIView(RelatedHabitsMixin, generics.GenericAPIView):
+    """Creates habits and updates habits of the user (items with "id") in batches. Items are validated one by one,
+    invalid items are reported by their index and don't prevent the others from being saved."""
+
+    serializer_class = HabitSerializer
 
-class PublicHabitListAPIView(generics.ListAPIView):
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return Response({"detail": "Expected a list of habits."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > HABIT_BULK_MAX_SIZE:
+            return Response(
+                {"detail": f"Not more than {HABIT_BULK_MAX_SIZE} habits can be saved at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Ids of updated habits, None for new habits and for items with an invalid id.
+        pks = [int(item["id"]) if str(item.get("id")).isdigit() else None for item in items]
+        instances = Habit.objects.filter(user=request.user).in_bulk({pk for pk in pks if pk})
+        # get_serializer builds the context for every call, the prefetched one is shared by all items instead.
+        serializer_class, context = self.get_serializer_class(), self.get_serializer_context()
+        fields = {field.attname for field in Habit._meta.concrete_fields if not field.primary_key}
+
+        results, new_habits, changed_habits = [], [], []
+        for index, (item, pk) in enumerate(zip(items, pks)):
+            if item.get("id") and pk is None:
+                errors = {"id": ["A valid integer is required."]}
+                results.append({"index": index, "status": "invalid", "errors": errors})
+                continue
+            instance = instances.get(pk) if pk else None
+            if pk and instance is None:
+                results.append({"index": index, "status": "invalid", "errors": {"id": ["Habit not found."]}})
+                continue
+            serializer = serializer_class(instance, data=item, context=context)
+            if not serializer.is_valid():
+                results.append({"index": index, "status": "invalid", "errors": serializer.errors})
+                continue
+            data = {**serializer.validated_data, "user_id": request.user.pk}
+            if not data.get("is_pleasant"):
+                data.update(render_schedule(data))
+            habit = instance or Habit()
+            for field, value in data.items():
+                if field in fields:
+                    setattr(habit, field, value)
+            if instance:
+                changed_habits.append(habit)
+                results.append({"index": index, "status": "updated", "habit": habit})
+            else:
+                new_habits.append(habit)
+                results.append({"index": index, "status": "created", "habit": habit})
+
+        record_changes = bool(request.user.tg_chat_id) and HABIT_REMINDER_MODE == "periodic_task"
+        with transaction.atomic():
+            bulk_save_habits(new_habits, changed_habits, record_changes)
+            if record_changes and (new_habits or changed_habits):
+                transaction.on_commit(drain_schedule_outbox.delay, robust=True)
+
+        with phase("serialize"):
+            for result in results:
+                if "habit" in result:
+                    result["habit"] = serializer_class(result["habit"], context=context).data
+        if new_habits:
+            response_status = status.HTTP_201_CREATED
+        elif changed_habits:
+            response_status = status.HTTP_200_OK
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(results, status=response_status)
+
+
+class HabitPaginationMixin:
+    """Selects pagination of a habit list per request, see select_pagination_class."""
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            pagination_class = select_pagination_class(self.request, self.pagination_class)
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
+
+
+class PublicHabitListAPIView(HabitPaginationMixin, generics.ListAPIView):
     serializer_class = PublicHabitSerializer
+    pagination_class = HabitPagination
 
     def get_queryset(self):
-        return Habit.objects.filter(is_public=True)
-
-
-class HabitListAPIView(generics.ListAPIView):
+        return Habit.objects.filter(is_public=True).order_by("pk")
+
+    def list(self, request, *args, **kwargs):
+        """Serves rendered pages from the cache (with a shared cache, see PUBLIC_HABITS_CACHE_ENABLED) and answers 304
+        if the client already has the page."""
+        if request.accepted_renderer.format == "api":
+            return super().list(request, *args, **kwargs)
+
+        key = get_public_habits_cache_key(request) if PUBLIC_HABITS_CACHE_ENABLED else None
+        page = cache.get(key) if key else None
+        if page is None:
+            response = super().list(request, *args, **kwargs)
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+            page = (response.content, response["Content-Type"], etag)
+            if key:
+                cache.set(key, page, PUBLIC_HABITS_CACHE_TIMEOUT)
+
+        content, content_type, etag = page
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response["ETag"] = etag
+        return response
+
+
+class HabitListAPIView(HabitPaginationMixin, generics.ListAPIView):
     serializer_class = HabitSerializer
     pagination_class = HabitPagination
 
     def get_queryset(self):
-        return Habit.objects.filter(user=self.request.user)
+        return Habit.objects.filter(user=self.request.user).order_by("pk")
+
+    def list(self, request, *args, **kwargs):
+        """Fetches habits as dicts and serializes them with serialize_habit_rows, the output is the same as
+        HabitSerializer's."""
+        queryset = self.get_queryset().values(*HABIT_VALUES)
+        page = self.paginate_queryset(queryset)
+        with phase("serialize"):
+            data = serialize_habit_rows(queryset if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
 
 class HabitRetrieveAPIView(generics.RetrieveAPIView):
@@ -45,28 +199,28 @@ class HabitRetrieveAPIView(generics.RetrieveAPIView):
     permission_classes = (IsUser,)
 
 
-class HabitUpdateAPIView(generics.UpdateAPIView):
-    queryset = Habit.objects.all()
+class HabitUpdateAPIView(RelatedHabitsMixin, generics.UpdateAPIView):
+    queryset = Habit.objects.select_related("related_habit")
     serializer_class = HabitSerializer
     permission_classes = (IsUser,)
 
     def perform_update(self, serializer):
-        habit = serializer.save(user=self.request.user)
-        if not habit.is_pleasant:
-            replacements = create_replacements(habit)
-            habit.frequency = make_replacements(habit.frequency, replacements)
-            habit.save()
-
-            if habit.user.tg_chat_id:
-                task = get_object_or_404(PeriodicTask, name=f"Sending reminder {habit.pk}")
-                schedule = create_schedule(habit.frequency)
-                if task:
-                    task.enabled = False
-                    task.delete()
-                create_task(schedule, habit)
+        save_habit(serializer, self.request.user)
 
 
 class HabitDestroyAPIView(generics.DestroyAPIView):
     queryset = Habit.objects.all()
     permission_classes = (IsUser,)
 
+
+class ReminderForecastAPIView(APIView):
+    """Forecasts how many reminders will be sent in every minute of the next days (7 max)."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        days = request.query_params.get("days", "1")
+        days = min(int(days), 7) if days.isdigit() and int(days) > 0 else 1
+        start = timezone.now()
+        volumes = forecast_reminders(start, days * 24 * 60)
+        return Response({**summarize_forecast(volumes, start), "reminders": volumes.tolist()})
@@ -0,0 +1,107 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from config.settings import JWT_USER_CACHE_ENABLED, JWT_USER_CACHE_SIZE, JWT_USER_CACHE_TIMEOUT
+from users.models import User
+
+
+def get_user_version_key(user_id) -> str:
+    return f"jwt-user-version:{user_id}"
+
+
+def get_user_version_timeout() -> float:
+    """Versions are kept as long as access tokens live. An expired version is replaced with a new one, which only
+    makes processes reload the user."""
+    return api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+
+def get_user_version(user_id) -> int:
+    """Returns the version of the user kept in the shared cache, it changes whenever the user is invalidated."""
+    return cache.get_or_set(get_user_version_key(user_id), time.time_ns, timeout=get_user_version_timeout())
+
+
+def invalidate_user(user_id) -> None:
+    """Makes all processes reload the user on the next request by changing the version of the user."""
+    cache.set(get_user_version_key(user_id), time.time_ns(), timeout=get_user_version_timeout())
+
+
+class UserCache:
+    """Bounded LRU cache of users keyed by (user id, version) kept in the memory of the process. Entries expire after
+    the timeout, a new version of the user makes the old entry unreachable."""
+
+    def __init__(self, maxsize: int = JWT_USER_CACHE_SIZE, timeout: float = JWT_USER_CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.users = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> User | None:
+        with self.lock:
+            user, expires_at = self.users.get(key, (None, 0))
+            if user is None or expires_at < time.monotonic():
+                self.users.pop(key, None)
+                self.misses += 1
+                return None
+            self.users.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def set(self, key: tuple, user: User) -> None:
+        with self.lock:
+            self.users[key] = (user, time.monotonic() + self.timeout)
+            self.users.move_to_end(key)
+            while len(self.users) > self.maxsize:
+                self.users.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.users.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> dict:
+        """Returns hit and miss counters, hit rate and size of the cache."""
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "maxsize": self.maxsize,
+                "currsize": len(self.users),
+            }
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that takes the user from the in-process user cache instead of the database. The version of
+    the user is shared by all processes through the Django cache, so a user changed by one process is reloaded by
+    the others (see users.signals). Without a shared cache (JWT_USER_CACHE_ENABLED) users are loaded from the
+    database on every request."""
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not JWT_USER_CACHE_ENABLED or user_id is None:
+            return super().get_user(validated_token)
+        key = (str(user_id), get_user_version(user_id))
+        user = user_cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(key, user)
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        # Every request gets its own copy, so that changes made while handling a request don't leak to others.
+        return copy.copy(user)
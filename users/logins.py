@@ -0,0 +1,103 @@
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+import redis
+from django.db import DatabaseError, connections
+
+from config.settings import LAST_LOGIN_BUFFER, LAST_LOGIN_FLUSH_INTERVAL, LAST_LOGIN_REDIS_URL
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+# Takes all buffered logins at once, so that logins recorded while they are written are kept for the next flush.
+POP_SCRIPT = """
+local logins = redis.call("HGETALL", KEYS[1])
+redis.call("DEL", KEYS[1])
+return logins
+"""
+
+
+class MemoryLoginBuffer:
+    """Last logins kept in the memory of the process. Celery can't reach them, so a background thread of the process
+    writes them every flush interval and on exit. Logins buffered since the last flush are lost if the process is
+    killed."""
+
+    def __init__(self, interval: float = LAST_LOGIN_FLUSH_INTERVAL):
+        self.interval = interval
+        self.logins = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, user_id: int, moment: datetime) -> None:
+        """Records the login of the user."""
+        with self.lock:
+            self.logins[user_id] = max(moment, self.logins.get(user_id, moment))
+
+    def pop(self) -> dict[int, datetime]:
+        """Takes all buffered logins out of the buffer."""
+        with self.lock:
+            logins, self.logins = self.logins, {}
+        return logins
+
+    def start(self) -> None:
+        """Starts the background thread writing buffered logins every flush interval."""
+        threading.Thread(target=self.run, name="last-login-flush", daemon=True).start()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                flush_last_logins(self)
+            except DatabaseError:
+                logger.exception("Buffered logins couldn't be written.")
+            finally:
+                connections.close_all()
+
+    def stop(self) -> None:
+        """Stops the background thread and writes logins left in the buffer."""
+        self.stopped.set()
+        flush_last_logins(self)
+
+
+class RedisLoginBuffer:
+    """Last logins shared by all processes through a Redis hash and written by the flush_buffered_logins task."""
+
+    key = "last-login-buffer"
+
+    def __init__(self, url: str = LAST_LOGIN_REDIS_URL):
+        self.client = redis.Redis.from_url(url)
+        self.pop_script = self.client.register_script(POP_SCRIPT)
+
+    def add(self, user_id: int, moment: datetime) -> None:
+        """Records the login of the user."""
+        self.client.hset(self.key, str(user_id), moment.timestamp())
+
+    def pop(self) -> dict[int, datetime]:
+        """Takes all buffered logins out of the buffer."""
+        values = self.pop_script(keys=(self.key,))
+        pairs = zip(values[::2], values[1::2])
+        return {int(user_id): datetime.fromtimestamp(float(moment), tz=timezone.utc) for user_id, moment in pairs}
+
+
+def flush_last_logins(buffer: MemoryLoginBuffer | RedisLoginBuffer, batch_size: int = 1000) -> int:
+    """Writes buffered logins to last_login of users in bulk and returns the number of users updated."""
+    logins = buffer.pop()
+    users = [User(pk=user_id, last_login=moment) for user_id, moment in logins.items()]
+    User.objects.bulk_update(users, ("last_login",), batch_size=batch_size)
+    return len(users)
+
+
+login_buffer = None
+
+
+def get_login_buffer() -> MemoryLoginBuffer | RedisLoginBuffer | None:
+    """Returns the login buffer selected in settings, None if last_login is written on every login."""
+    global login_buffer
+    if login_buffer is None and LAST_LOGIN_BUFFER == "redis":
+        login_buffer = RedisLoginBuffer()
+    elif login_buffer is None and LAST_LOGIN_BUFFER == "memory":
+        login_buffer = MemoryLoginBuffer()
+        login_buffer.start()
+        atexit.register(login_buffer.stop)
+    return login_buffer
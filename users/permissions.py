@@ -4,4 +4,4 @@ from rest_framework.permissions import BasePermission
 class IsUser(BasePermission):
 
     def has_object_permission(self, request, view, obj):
-        return obj.user == request.user
+        return obj.user_id == request.user.pk
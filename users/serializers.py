@@ -1,5 +1,8 @@
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from users.logins import get_login_buffer
 from users.models import User
 
 
@@ -8,3 +11,15 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = "__all__"
+
+
+class LoginSerializer(TokenObtainPairSerializer):
+    """Issues a token pair recording the login in the login buffer when one is configured. Otherwise last_login is
+    updated by simplejwt (see SIMPLE_JWT["UPDATE_LAST_LOGIN"])."""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        buffer = get_login_buffer()
+        if buffer is not None:
+            buffer.add(self.user.pk, timezone.now())
+        return data
@@ -0,0 +1,25 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.authentication import invalidate_user
+from users.models import User
+
+# Fields checked on every authenticated request or used by habits views.
+AUTH_FIELDS = {"password", "is_active", "tg_chat_id"}
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_on_save(sender, instance, update_fields=None, **kwargs):
+    """Invalidates cached users after the commit when a user is saved unless the save doesn't touch auth fields."""
+    if update_fields is not None and not AUTH_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(partial(invalidate_user, instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_user_on_delete(sender, instance, **kwargs):
+    """Invalidates cached users after the commit when a user is deleted."""
+    transaction.on_commit(partial(invalidate_user, instance.pk))
@@ -0,0 +1,20 @@
+from celery import shared_task
+from celery.signals import worker_shutdown
+
+from config.settings import LAST_LOGIN_BUFFER
+from users.logins import flush_last_logins, get_login_buffer
+
+
+@shared_task
+def flush_buffered_logins() -> int:
+    """Writes logins buffered in Redis to last_login of users in bulk. Returns the number of users updated. Memory
+    buffers are written by their own processes, so a worker doesn't create one."""
+    if LAST_LOGIN_BUFFER != "redis":
+        return 0
+    return flush_last_logins(get_login_buffer())
+
+
+@worker_shutdown.connect
+def flush_buffered_logins_on_shutdown(**kwargs):
+    """Writes logins left in the buffer when the worker stops."""
+    flush_buffered_logins()
@@ -1,3 +1,136 @@
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import user_cache
+from users.logins import MemoryLoginBuffer, flush_last_logins
+from users.models import User
+from users.tasks import flush_buffered_logins
+
+
+@patch("users.authentication.JWT_USER_CACHE_ENABLED", True)
+class CachedJWTAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create(email="user@user.ru", tg_chat_id="12345")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.url = reverse("habits:habit-list")
+
+    def test_user_cached(self):
+        # user and count of habits, then count of habits only
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(user_cache.info(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "maxsize": 1024, "currsize": 1})
+
+    def test_user_not_cached_without_shared_cache(self):
+        with patch("users.authentication.JWT_USER_CACHE_ENABLED", False):
+            for _ in range(2):
+                with self.assertNumQueries(2):
+                    self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        self.assertEqual(user_cache.info()["currsize"], 0)
+
+    def test_user_invalidated(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_not_invalidated_by_last_login(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user.save(update_fields=("last_login",))
+
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+
+class LoginBufferTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(email="user@user.ru")
+        self.user.set_password("password")
+        self.user.save()
+        self.buffer = MemoryLoginBuffer(interval=60)
+        self.url = reverse("users:user_login")
+
+    @patch("rest_framework_simplejwt.serializers.api_settings.UPDATE_LAST_LOGIN", False)
+    def test_login_buffered(self):
+        with patch("users.serializers.get_login_buffer", return_value=self.buffer):
+            response = self.client.post(self.url, {"email": "user@user.ru", "password": "password"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        self.assertEqual(list(self.buffer.logins), [self.user.pk])
+
+        self.assertEqual(flush_last_logins(self.buffer), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(self.buffer.logins, {})
+
+    def test_login_not_buffered(self):
+        with patch("users.serializers.get_login_buffer", return_value=None):
+            response = self.client.post(self.url, {"email": "user@user.ru", "password": "password"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    @patch("users.tasks.LAST_LOGIN_BUFFER", "memory")
+    def test_flush_task_without_redis_buffer(self):
+        with patch("users.tasks.get_login_buffer") as get_login_buffer:
+            self.assertEqual(flush_buffered_logins(), 0)
+
+        get_login_buffer.assert_not_called()
+
+
+class MemoryLoginBufferTestCase(TestCase):
+
+    def setUp(self):
+        self.users = User.objects.bulk_create(User(email=f"user{i}@user.ru") for i in range(3))
+
+    def test_flush_in_bulk(self):
+        buffer = MemoryLoginBuffer(interval=60)
+        moment = timezone.now()
+        for user in self.users:
+            buffer.add(user.pk, moment)
+        buffer.add(self.users[0].pk, moment - timedelta(minutes=1))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_last_logins(buffer), 3)
+        self.assertEqual(User.objects.filter(last_login=moment).count(), 3)
+
+    def test_flush_on_timer(self):
+        buffer = MemoryLoginBuffer(interval=0.01)
+        flushed = threading.Event()
+        with patch("users.logins.flush_last_logins", side_effect=lambda buffer: flushed.set()):
+            buffer.start()
+            self.assertTrue(flushed.wait(5))
+            buffer.stopped.set()
+
+    def test_flush_on_stop(self):
+        buffer = MemoryLoginBuffer(interval=60)
+        moment = timezone.now()
+        buffer.add(self.users[0].pk, moment)
+        buffer.stop()
 
-# Create your tests here.
+        self.assertTrue(buffer.stopped.is_set())
+        self.assertEqual(buffer.logins, {})
+        self.assertEqual(User.objects.get(pk=self.users[0].pk).last_login, moment)